@@ -0,0 +1,66 @@
+"""Minimal in-process ASGI HTTP client for driving the real application."""
+
+import asyncio
+import json
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+async def request(app, method, path, *, headers=None, query="", json_body=None):
+    body = b"" if json_body is None else json.dumps(json_body).encode()
+    raw_headers = [(b"host", b"localhost")]
+    if json_body is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode(), str(value).encode()))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+
+    received = False
+    complete = asyncio.Event()
+
+    async def receive():
+        nonlocal received
+        if received:
+            # Django listens for a disconnect while the view runs and aborts
+            # the request on one; the client only leaves once it is served.
+            await complete.wait()
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    status, response_headers, chunks = None, [], []
+
+    async def send(message):
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                complete.set()
+
+    await app(scope, receive, send)
+    return Response(status, dict(response_headers), b"".join(chunks))
@@ -0,0 +1,78 @@
+"""Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway test database created from the regular
+settings, so they need the same Postgres as the test suite (see
+``docker-compose.yaml``). Run them from the repository root, e.g.::
+
+    python -m benchmarks.read_event
+"""
+
+from contextlib import contextmanager
+import os
+from pathlib import Path
+import statistics
+import sys
+import time
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def setup_django():
+    if str(SRC_DIR) not in sys.path:
+        sys.path.insert(0, str(SRC_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def run_async(func, *args):
+    """Run ``func`` like Django runs async tests.
+
+    ``async_to_sync`` keeps thread-sensitive ORM calls on this thread, so the
+    queries go through the same connection as ``test_database()``.
+    """
+    from asgiref.sync import async_to_sync
+
+    return async_to_sync(func)(*args)
+
+
+async def time_async(func, repeat):
+    """Await ``func()`` ``repeat`` times and return per-call timings in ms."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def percentile(timings, pct):
+    ordered = sorted(timings)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def summarize(timings):
+    return {
+        "mean": statistics.fmean(timings),
+        "p50": percentile(timings, 50),
+        "p95": percentile(timings, 95),
+        "p99": percentile(timings, 99),
+    }
@@ -0,0 +1,128 @@
+"""Connection setup cost under concurrent load, with and without pooling.
+
+Sends the same burst of ``get_ballot`` requests through the ASGI app once per
+configuration. Unlike ``read_event``, which polls are served from the event
+snapshot cache, it makes a query every time. Database settings are read at startup, so each configuration
+runs in a fresh interpreter with its environment:
+
+    new      a new connection per request (the default)
+    pooled   psycopg's connection pool (DJANGO_DB_POOL=true)
+
+For each it reports request latency, how many connections Django set up and
+the total time spent doing so (for the pool, checking a connection out).
+
+    python -m benchmarks.connections [--requests 2000] [--concurrency 50]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import run_async, setup_django, summarize, test_database
+
+CONFIGURATIONS = {
+    "new": {"DJANGO_DB_POOL": "false", "DJANGO_DB_CONN_MAX_AGE": "0"},
+    "pooled": {"DJANGO_DB_POOL": "true"},
+}
+
+
+class ConnectTimer:
+    """Times ``DatabaseWrapper.connect()``, called once per connection set up."""
+
+    def __init__(self, wrapper_class):
+        self.connects = 0
+        self.seconds = 0.0
+        connect = wrapper_class.connect
+
+        def timed_connect(wrapper):
+            start = time.perf_counter()
+            try:
+                return connect(wrapper)
+            finally:
+                self.connects += 1
+                self.seconds += time.perf_counter() - start
+
+        wrapper_class.connect = timed_connect
+
+
+async def run(args, timer):
+    from config.asgi import application
+    from vote.models import Ballot, Event
+
+    from benchmarks.loadtest import LoadGenerator
+
+    event = await Event.objects.acreate(
+        name="Connections", choices=["A", "B"], electoral_system="PL"
+    )
+    ballot = await Ballot.objects.acreate(event=event, voter_name="Voter")
+    headers = {"X-API-Key": str(event.host_token)}
+    load = LoadGenerator(application, args.concurrency)
+
+    def get_ballot():
+        return load.call("get_ballot", "GET", f"/ballot/{ballot.id}", headers=headers)
+
+    # Warm up so the pool, if any, has opened its connections.
+    await load.phase("warmup", [get_ballot for _ in range(args.concurrency)])
+    load.timings.clear()
+    timer.connects, timer.seconds = 0, 0.0
+
+    await load.phase("get_ballot", [get_ballot for _ in range(args.requests)])
+    timings = load.timings["get_ballot"]
+    return {
+        **summarize(timings),
+        "throughput": len(timings) / load.elapsed["get_ballot"],
+        "connects": timer.connects,
+        "connect_ms": timer.seconds * 1000,
+        "errors": load.errors["get_ballot"],
+    }
+
+
+def measure(args):
+    setup_django()
+    from django.db import connections
+
+    connection = connections["default"]
+    timer = ConnectTimer(type(connection))
+    with test_database():
+        result = run_async(run, args, timer)
+        connection.close_pool()
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        return measure(args)
+
+    print(
+        f"{'config':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}"
+        f" {'connects':>8} {'connect ms':>10}"
+    )
+    for name, environ in CONFIGURATIONS.items():
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.connections", "--measure"]
+            + ["--requests", str(args.requests)]
+            + ["--concurrency", str(args.concurrency)],
+            env={**os.environ, **environ},
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        print(
+            f"{name:<8} {result['p50']:>8.2f} {result['p95']:>8.2f}"
+            f" {result['p99']:>8.2f} {result['throughput']:>8.1f}"
+            f" {result['connects']:>8} {result['connect_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Load test of the full ASGI application through an event's lifecycle.
+
+Requests go through ``config.asgi.application`` in-process, middleware and
+URL routing included, from ``--concurrency`` concurrent clients. One run
+creates an event, registers ``--voters`` ballots one request at a time,
+opens voting, submits every ballot, closes the event and publishes its
+results, then has hosts and voters poll ``list_ballots`` and ``read_event``
+``--polls`` times in total.
+
+Every request comes from the same client address, so unless
+``DJANGO_VOTE_RATE_LIMIT_BURST`` is set, the rate limits of ``create_ballot``
+and ``submit_ballot`` are raised to let all ``--voters`` through.
+
+Each endpoint reports p50/p95/p99 latency, throughput over its phase and
+the number of SQL queries per request. Results are written as JSON (by
+default under ``benchmarks/results/``); pass a previous file to
+``--compare`` to print the change of every metric against it.
+
+    python -m benchmarks.loadtest [--voters 5000] [--polls 5000]
+        [--concurrency 50] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import random
+import subprocess
+import time
+
+from benchmarks import asgi
+from benchmarks.common import run_async, setup_django, summarize, test_database
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+API = "/api/vote"
+
+# Endpoints sharing a phase with another; the rest run in their own.
+PHASES = {"list_ballots": "poll", "read_event": "poll"}
+
+endpoint = ContextVar("endpoint", default=None)
+
+
+class QueryCounter:
+    """Counts SQL queries per endpoint on every database connection.
+
+    The load generator sets ``endpoint`` around each request; the context
+    follows the request into the threads running ORM calls.
+    """
+
+    def __init__(self):
+        self.queries = defaultdict(int)
+        self.wrapped = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        name = endpoint.get()
+        if name is not None:
+            self.queries[name] += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if id(connection) not in self.wrapped:
+            self.wrapped.add(id(connection))
+            connection.execute_wrappers.append(self)
+
+
+class LoadGenerator:
+    def __init__(self, app, concurrency):
+        self.app = app
+        self.concurrency = concurrency
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.elapsed = defaultdict(float)
+
+    async def call(self, name, method, path, **kwargs):
+        token = endpoint.set(name)
+        start = time.perf_counter()
+        try:
+            response = await asgi.request(self.app, method, API + path, **kwargs)
+        finally:
+            self.timings[name].append((time.perf_counter() - start) * 1000)
+            endpoint.reset(token)
+        if response.status >= 400:
+            self.errors[name] += 1
+        return response
+
+    async def phase(self, name, requests):
+        """Run ``requests`` (coroutine factories) ``concurrency`` at a time."""
+        queue = asyncio.Queue()
+        for request in requests:
+            queue.put_nowait(request)
+        results = []
+
+        async def worker():
+            while not queue.empty():
+                results.append(await queue.get_nowait()())
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        self.elapsed[name] += time.perf_counter() - start
+        return results
+
+
+async def run(args, counter):
+    from config.asgi import application
+
+    load = LoadGenerator(application, args.concurrency)
+    rng = random.Random(args.seed)
+    choices = [f"Choice {i}" for i in range(5)]
+
+    created = await load.call(
+        "create_event",
+        "POST",
+        "/event/create",
+        json_body={
+            "name": "Load test",
+            "choices": choices,
+            "electoral_system": "RC",
+        },
+    )
+    event = created.json()
+    event_id = event["id"]
+    host = {"X-API-Key": event["host_token"]}
+    share = {"X-API-Key": event["share_token"]}
+
+    def create_ballot(i):
+        return lambda: load.call(
+            "create_ballot",
+            "POST",
+            f"/event/{event_id}/create-ballot",
+            headers=share,
+            query=f"voter_name=Voter+{i}",
+        )
+
+    ballots = await load.phase(
+        "create_ballot", [create_ballot(i) for i in range(args.voters)]
+    )
+    ballots = [x.json() for x in ballots if x.status == 200]
+
+    await load.call("open_event", "POST", f"/event/{event_id}/open", headers=host)
+
+    def submit_ballot(ballot):
+        vote = rng.sample(choices, rng.randint(1, len(choices)))
+        return lambda: load.call(
+            "submit_ballot",
+            "POST",
+            f"/ballot/{ballot['ballot_id']}/submit",
+            headers={"X-API-Key": ballot["ballot_token"]},
+            json_body={"vote": vote},
+        )
+
+    await load.phase("submit_ballot", [submit_ballot(x) for x in ballots])
+
+    await load.call("close_event", "POST", f"/event/{event_id}/close", headers=host)
+    await load.call(
+        "show_results", "POST", f"/event/{event_id}/show-results", headers=host
+    )
+
+    def poll(i):
+        if i % 2:
+            ballot = rng.choice(ballots)
+            return lambda: load.call(
+                "read_event",
+                "GET",
+                f"/event/{event_id}",
+                headers={"X-API-Key": ballot["ballot_token"]},
+            )
+        return lambda: load.call(
+            "list_ballots",
+            "GET",
+            f"/event/{event_id}/ballots",
+            headers=host,
+            query=f"limit={args.page_size}",
+        )
+
+    await load.phase("poll", [poll(i) for i in range(args.polls)])
+
+    endpoints = {}
+    for name, timings in load.timings.items():
+        # Single requests outside a phase count their own duration.
+        elapsed = load.elapsed.get(PHASES.get(name, name), sum(timings) / 1000)
+        endpoints[name] = {
+            "requests": len(timings),
+            "errors": load.errors[name],
+            **summarize(timings),
+            "throughput": len(timings) / elapsed,
+            "queries_per_request": counter.queries[name] / len(timings),
+        }
+    return endpoints
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(endpoints, previous=None):
+    columns = ["p50", "p95", "p99", "throughput", "queries_per_request"]
+    print(
+        f"{'endpoint':<14} {'requests':>8} {'errors':>6} {'p50 ms':>8}"
+        f" {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>7}"
+    )
+    for name, stats in endpoints.items():
+        print(
+            f"{name:<14} {stats['requests']:>8} {stats['errors']:>6}"
+            f" {stats['p50']:>8.2f} {stats['p95']:>8.2f} {stats['p99']:>8.2f}"
+            f" {stats['throughput']:>8.1f} {stats['queries_per_request']:>7.2f}"
+        )
+        before = (previous or {}).get(name)
+        if before:
+            changes = " ".join(
+                f"{column}={change(before[column], stats[column])}"
+                for column in columns
+            )
+            print(f"{'':<14} vs previous: {changes}")
+
+
+def change(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--voters", type=int, default=5000)
+    parser.add_argument("--polls", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path)
+    args = parser.parse_args()
+
+    # All voters register and submit from one address.
+    os.environ.setdefault("DJANGO_VOTE_RATE_LIMIT_BURST", str(max(args.voters, 1)))
+    setup_django()
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    counter = QueryCounter()
+    connection_created.connect(counter.install)
+    for connection in connections.all(initialized_only=True):
+        counter.install(connection)
+
+    with test_database():
+        endpoints = run_async(run, args, counter)
+
+    previous = None
+    if args.compare:
+        previous = json.loads(args.compare.read_text())["endpoints"]
+    report(endpoints, previous)
+
+    now = datetime.now(tz=timezone.utc)
+    output = args.output or RESULTS_DIR / f"loadtest-{now:%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps(
+            {
+                "revision": git_revision(),
+                "timestamp": now.isoformat(),
+                "config": {
+                    key: value
+                    for key, value in vars(args).items()
+                    if key not in ("output", "compare")
+                },
+                "endpoints": endpoints,
+            },
+            indent=2,
+        )
+    )
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Per-request overhead of the middleware stack on the async vote API.
+
+Sends the same sequential ``read_event`` requests through the ASGI app once
+per configuration, after warming the event cache so the view itself makes
+no query. The middleware is set up at startup, so each configuration runs
+in a fresh interpreter with its environment:
+
+    default  Django's default middleware stack
+    api      the API profile (DJANGO_API_PROFILE=true)
+
+For each it reports request latency and the number of sync-to-async thread
+hops per request.
+
+    python -m benchmarks.middleware [--requests 5000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import run_async, setup_django, summarize, test_database
+
+CONFIGURATIONS = {
+    "default": {"DJANGO_API_PROFILE": "false"},
+    "api": {"DJANGO_API_PROFILE": "true"},
+}
+
+
+class HopCounter:
+    """Counts calls made through ``sync_to_async``."""
+
+    def __init__(self):
+        from asgiref.sync import SyncToAsync
+
+        self.hops = 0
+        call = SyncToAsync.__call__
+
+        async def counted_call(wrapper, *args, **kwargs):
+            self.hops += 1
+            return await call(wrapper, *args, **kwargs)
+
+        SyncToAsync.__call__ = counted_call
+
+
+async def run(args, counter):
+    from config.asgi import application
+    from vote.models import Event
+
+    from benchmarks.loadtest import LoadGenerator
+
+    event = await Event.objects.acreate(
+        name="Middleware", choices=["A", "B"], electoral_system="PL"
+    )
+    headers = {"X-API-Key": str(event.host_token)}
+    load = LoadGenerator(application, 1)
+
+    def read_event():
+        return load.call("read_event", "GET", f"/event/{event.id}", headers=headers)
+
+    await load.phase("warmup", [read_event for _ in range(100)])
+    load.timings.clear()
+    counter.hops = 0
+
+    await load.phase("read_event", [read_event for _ in range(args.requests)])
+    timings = load.timings["read_event"]
+    return {
+        **summarize(timings),
+        "hops": counter.hops / len(timings),
+        "errors": load.errors["read_event"],
+    }
+
+
+def measure(args):
+    setup_django()
+    counter = HopCounter()
+    with test_database():
+        result = run_async(run, args, counter)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        return measure(args)
+
+    print(
+        f"{'config':<8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        f" {'hops':>6}"
+    )
+    for name, environ in CONFIGURATIONS.items():
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.middleware", "--measure"]
+            + ["--requests", str(args.requests)],
+            env={**os.environ, **environ},
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        print(
+            f"{name:<8} {result['mean']:>8.3f} {result['p50']:>8.3f}"
+            f" {result['p95']:>8.3f} {result['p99']:>8.3f} {result['hops']:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
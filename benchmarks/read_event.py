@@ -0,0 +1,85 @@
+"""Latency of ``read_event`` as the number of ballots in an event grows.
+
+Compares the current single-query role lookup against the previous
+implementation, which loaded every ballot token of the event to check the
+caller's X-API-Key.
+
+    python -m benchmarks.read_event [--ballots 10 100 1000 10000] [--repeat 50]
+"""
+
+import argparse
+
+from benchmarks.common import (
+    run_async,
+    setup_django,
+    summarize,
+    test_database,
+    time_async,
+)
+
+
+async def legacy_authorize(event_id, token):
+    from django.shortcuts import aget_object_or_404
+    from vote.models import Event
+
+    event = await aget_object_or_404(Event, pk=event_id)
+    return (
+        token == event.share_token
+        or token == event.host_token
+        or token in [x.token async for x in event.ballot_set.all()]
+    )
+
+
+async def run(ballot_counts, repeat):
+    from ninja.testing import TestAsyncClient
+    from vote.api import router
+    from vote.models import Ballot, Event
+
+    client = TestAsyncClient(router)
+
+    print(
+        f"{'ballots':>8} {'legacy p50':>11} {'p50 ms':>8} {'p95 ms':>8}"
+        f" {'p99 ms':>8}"
+    )
+    for count in ballot_counts:
+        event = await Event.objects.acreate(
+            name=f"Bench {count}", choices=["A", "B", "C"], electoral_system="PL"
+        )
+        await Ballot.objects.abulk_create(
+            (Ballot(event=event, voter_name=f"Voter {i}") for i in range(count)),
+            batch_size=5000,
+        )
+        # The newest ballot is the worst case for the legacy token scan.
+        token = (await Ballot.objects.filter(event=event).alatest("created")).token
+
+        async def request():
+            response = await client.get(
+                f"/event/{event.id}", headers={"X-API-Key": token}
+            )
+            assert response.status_code == 200, response.status_code
+
+        legacy = summarize(
+            await time_async(lambda: legacy_authorize(event.id, token), repeat)
+        )
+        current = summarize(await time_async(request, repeat))
+        print(
+            f"{count:>8} {legacy['p50']:>11.2f} {current['p50']:>8.2f}"
+            f" {current['p95']:>8.2f} {current['p99']:>8.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--ballots", type=int, nargs="+", default=[10, 100, 1000, 10000]
+    )
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run_async(run, args.ballots, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
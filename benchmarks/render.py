@@ -0,0 +1,112 @@
+"""Compare the JSON backends on large ``list_ballots`` responses.
+
+Builds ballots in memory (random ranked-choice votes, half of them
+submitted) and times turning them into response dicts, through
+``BallotSchema`` as Ninja validates responses and as rows the way
+``list_ballots`` does, then rendering them with each backend of
+``config.renderers``. Nothing is read from the database, so this needs no
+Postgres.
+
+    python -m benchmarks.render [--ballots 1000 10000 100000] [--repeat 5]
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import random
+import time
+import uuid
+
+from benchmarks.common import setup_django
+
+
+def generate_ballots(count, seed=0):
+    from vote.models import Ballot, Event
+
+    rng = random.Random(seed)
+    event = Event(
+        id=1,
+        name="Render",
+        choices=[f"Chilli {i}" for i in range(8)],
+        electoral_system="RC",
+    )
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    ballots = []
+    for i in range(count):
+        created = start + timedelta(seconds=i, microseconds=rng.randrange(10**6))
+        submitted = rng.random() < 0.5
+        ballots.append(
+            Ballot(
+                id=i + 1,
+                event=event,
+                token=uuid.UUID(int=rng.getrandbits(128)),
+                voter_name=f"Voter {i}",
+                created=created,
+                ranking=rng.sample(range(8), rng.randint(1, 8)) if submitted else None,
+                submitted=created + timedelta(minutes=5) if submitted else None,
+            )
+        )
+    return ballots
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ballots", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+
+    from config.renderers import JSONRenderer, orjson
+    from vote.pagination import BALLOT_ROW, ballot_row
+    from vote.schemas import BallotSchema
+
+    backends = ["json"] + (["orjson"] if orjson is not None else [])
+    renderer = JSONRenderer()
+
+    header = " ".join(f"{backend + ' s':>10}" for backend in backends)
+    print(
+        f"{'ballots':>8} {'schema s':>9} {'rows s':>8} {header}"
+        f" {'speedup':>8} {'bytes':>10}"
+    )
+    for count in args.ballots:
+        ballots = generate_ballots(count)
+        schema, data = best_of(
+            args.repeat,
+            lambda: [BallotSchema.from_orm(x).model_dump() for x in ballots],
+        )
+        values = [{field: getattr(x, field) for field in BALLOT_ROW} for x in ballots]
+        event = ballots[0].event
+        rows, _ = best_of(
+            args.repeat,
+            lambda: [ballot_row(event, x, "names") for x in values],
+        )
+
+        timings, bodies = [], []
+        for backend in backends:
+            with override_settings(API_JSON_BACKEND=backend):
+                seconds, body = best_of(
+                    args.repeat,
+                    lambda: renderer.render(None, data, response_status=200),
+                )
+            timings.append(seconds)
+            bodies.append(body)
+
+        print(
+            f"{count:>8} {schema:>9.3f} {rows:>8.3f} "
+            + " ".join(f"{t:>10.4f}" for t in timings)
+            + f" {timings[0] / timings[-1]:>7.1f}x {len(bodies[-1]):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare the instant-runoff counting backends.
+
+Generates random ranked-choice ballots (random prefixes of a random order
+over ``--choices`` options), feeds them to each backend and times the
+elimination rounds separately from ingesting the rankings, which is shared by
+all backends. Ballots are not written to the database, so this measures the
+counting engine alone and needs no Postgres.
+
+    python -m benchmarks.tally [--ballots 1000 100000 1000000] [--choices 12]
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.common import setup_django
+
+
+def generate_rankings(count, choices, seed=0):
+    rng = random.Random(seed)
+    indices = range(len(choices))
+    return [
+        rng.sample(indices, rng.randint(1, len(choices))) for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--ballots", type=int, nargs="+", default=[1000, 100000, 1000000]
+    )
+    parser.add_argument("--choices", type=int, default=12)
+    args = parser.parse_args()
+
+    setup_django()
+    from vote.tally import TALLIES, get_tally
+
+    backends = list(TALLIES["RC"])
+    choices = [f"Choice {i}" for i in range(args.choices)]
+
+    header = " ".join(f"{backend + ' s':>10}" for backend in backends)
+    print(f"{'ballots':>8} {'rankings':>8} {'rounds':>6} {'ingest s':>9} {header}")
+    for count in args.ballots:
+        rankings = generate_rankings(count, choices)
+
+        start = time.perf_counter()
+        tally = get_tally("RC", choices, "python")
+        for ranking in rankings:
+            tally.add_encoded(ranking)
+        ingest = time.perf_counter() - start
+
+        results, timings = [], []
+        for backend in backends:
+            counter = get_tally("RC", choices, backend)
+            counter.ballots, counter.rankings = tally.ballots, tally.rankings
+            start = time.perf_counter()
+            results.append(counter.result())
+            timings.append(time.perf_counter() - start)
+
+        assert all(result == results[0] for result in results), "backends disagree"
+        print(
+            f"{count:>8} {len(tally.rankings):>8} {len(results[0].rounds):>6}"
+            f" {ingest:>9.3f} " + " ".join(f"{t:>10.3f}" for t in timings)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,21 @@
+import math
+
 from ninja import NinjaAPI
+from ninja.errors import Throttled
 
 from user.api import router as user_router
 from vote.api import router as vote_router
 
 from django.conf import settings
+from .renderers import JSONParser, JSONRenderer
 from .schema import VersionResponse
 
 api = NinjaAPI(
     title="Vote The Bowl API",
     version="0.4.1",
     docs_url=("/docs/" if settings.DEBUG else None),
+    renderer=JSONRenderer(),
+    parser=JSONParser(),
 )
 
 api.add_router("/user/", user_router)
@@ -18,6 +24,14 @@ api.add_router("/vote/", vote_router)
 # Add more routers as needed
 
 
+@api.exception_handler(Throttled)
+def throttled(request, exc: Throttled):
+    response = api.create_response(request, {"detail": str(exc)}, status=429)
+    if exc.wait is not None:
+        response["Retry-After"] = str(math.ceil(exc.wait))
+    return response
+
+
 @api.get("/version", response=VersionResponse, tags=["API Info"])
 async def version(request):
     return {"version": api.version}
@@ -0,0 +1,211 @@
+"""Per-route request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` records each request's latency, SQL query count and
+time, and response size under its URL route (e.g.
+``api/vote/event/<event_id>``), so the label set stays bounded. Queries are
+counted by an execute wrapper installed on every database connection; the
+request's counters live in a context variable, which follows the request
+into the threads running ORM calls. Counters are per process: with several
+workers, scrape each one or aggregate them downstream.
+
+It is enabled with ``DJANGO_METRICS=true``, which also serves the metrics
+at ``METRICS_PATH``. That path is meant for the internal network only and
+should not be routed by the public proxy. With ``DEBUG``, responses carry a
+``Server-Timing`` header with the same measurements.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+UNMATCHED = "<unmatched>"
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    query_seconds: float = 0.0
+
+
+current = ContextVar("current_request_stats", default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - start
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class Series:
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.response_bytes = 0
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = defaultdict(Series)
+
+    def observe(self, labels, seconds, stats, size):
+        with self.lock:
+            series = self.series[labels]
+            series.requests += 1
+            series.seconds += seconds
+            index = bisect_left(BUCKETS, seconds)
+            if index < len(BUCKETS):
+                series.buckets[index] += 1
+            series.queries += stats.queries
+            series.query_seconds += stats.query_seconds
+            series.response_bytes += size
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self) -> str:
+        with self.lock:
+            series = sorted(self.series.items())
+            lines = []
+            for name, kind, help, attribute in METRICS:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, values in series:
+                    if kind == "histogram":
+                        lines.extend(histogram(name, labels, values))
+                    else:
+                        value = getattr(values, attribute)
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = [
+    ("http_requests_total", "counter", "Requests handled.", "requests"),
+    ("http_request_duration_seconds", "histogram", "Request latency.", None),
+    ("http_request_db_queries_total", "counter", "SQL queries run.", "queries"),
+    (
+        "http_request_db_seconds_total",
+        "counter",
+        "Time spent in SQL queries.",
+        "query_seconds",
+    ),
+    (
+        "http_response_size_bytes_total",
+        "counter",
+        "Response body bytes.",
+        "response_bytes",
+    ),
+]
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def format_labels(labels, **extra) -> str:
+    method, route, status = labels
+    pairs = {"method": method, "route": route, "status": status, **extra}
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs.items()) + "}"
+
+
+def histogram(name, labels, values: Series):
+    lines, cumulative = [], 0
+    for bound, count in zip(BUCKETS, values.buckets):
+        cumulative += count
+        bucket = format_labels(labels, le=bound)
+        lines.append(f"{name}_bucket{bucket} {cumulative}")
+    bucket = format_labels(labels, le="+Inf")
+    lines.append(f"{name}_bucket{bucket} {values.requests}")
+    lines.append(f"{name}_sum{format_labels(labels)} {values.seconds}")
+    lines.append(f"{name}_count{format_labels(labels)} {values.requests}")
+    return lines
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        connection_created.connect(install_query_counter)
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, stats, start)
+
+    def start(self):
+        stats = RequestStats()
+        return stats, current.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, start):
+        seconds = time.perf_counter() - start
+        match = request.resolver_match
+        route = match.route if match else UNMATCHED
+        # Streamed bodies are not buffered, so they count as empty.
+        size = 0 if response.streaming else len(response.content)
+        labels = (request.method, route, str(response.status_code))
+        registry.observe(labels, seconds, stats, size)
+
+        if settings.DEBUG:
+            db = stats.query_seconds * 1000
+            response["Server-Timing"] = (
+                f"app;dur={seconds * 1000:.1f}, "
+                f'db;dur={db:.1f};desc="{stats.queries} queries"'
+            )
+        return response
+
+
+def metrics(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,67 @@
+"""Middleware stack of the API profile (``DJANGO_API_PROFILE=true``).
+
+Django's own middleware is sync-first: under ASGI, each of its request and
+response hooks runs in the thread pool, so the default stack adds a dozen
+thread hops to every request. The vote API authenticates with X-API-Key
+alone and needs none of it. ``PathScopedMiddleware`` sends requests under
+``ASYNC_API_PATHS`` straight to the view and runs ``SCOPED_MIDDLEWARE`` for
+every other path, such as the session-authenticated ``/api/user/``.
+
+Only the middleware's ``__call__`` runs, not ``process_view`` hooks, so the
+CSRF middleware is left out of the scoped stack; the API's views are exempt
+from it anyway, and Ninja's session auth checks the token itself.
+
+The vote API still gets the checks that cost no I/O, called inline rather
+than through the middleware: the host is validated against
+``ALLOWED_HOSTS``, and ``SecurityMiddleware`` makes its HTTPS redirect and
+adds its ``SECURE_*`` headers. ``CommonMiddleware``'s other features
+(``APPEND_SLASH``, ``PREPEND_WWW``) don't apply to it.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.handlers.exception import convert_exception_to_response
+from django.middleware.security import SecurityMiddleware
+from django.utils.module_loading import import_string
+
+
+def build_stack(middleware: list[str], get_response):
+    """Wrap ``get_response`` in ``middleware`` like Django's handler does."""
+    handler = get_response
+    for path in reversed(middleware):
+        handler = convert_exception_to_response(import_string(path)(handler))
+    return handler
+
+
+class PathScopedMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.scoped = build_stack(settings.SCOPED_MIDDLEWARE, get_response)
+        self.prefixes = tuple(settings.ASYNC_API_PATHS)
+        self.security = SecurityMiddleware(get_response)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if not request.path.startswith(self.prefixes):
+            return self.scoped(request)
+        if self.async_mode:
+            return self.acall_api(request)
+        return self.call_api(request)
+
+    def call_api(self, request):
+        response = self.check(request) or self.get_response(request)
+        return self.security.process_response(request, response)
+
+    async def acall_api(self, request):
+        response = self.check(request) or await self.get_response(request)
+        return self.security.process_response(request, response)
+
+    def check(self, request):
+        # Raises DisallowedHost, which the handler answers with a 400.
+        request.get_host()
+        return self.security.process_request(request)
@@ -57,6 +57,32 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# API profile (see config/middleware.py): the vote API skips the middleware
+# stack, whose sync hooks each cost a thread hop under ASGI, keeping only the
+# ALLOWED_HOSTS check and SecurityMiddleware's redirect and headers, called
+# inline. Every other path gets only what session auth needs. The messages
+# app, unused by the API, is left out too.
+API_PROFILE = env.bool("DJANGO_API_PROFILE", False)
+ASYNC_API_PATHS = ["/api/vote/"]
+SCOPED_MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+]
+
+if API_PROFILE:
+    INSTALLED_APPS.remove("django.contrib.messages")
+    MIDDLEWARE = ["config.middleware.PathScopedMiddleware"]
+
+# Request metrics (see config/metrics.py). The middleware goes first so its
+# timings cover the rest of the stack.
+METRICS_ENABLED = env.bool("DJANGO_METRICS", False)
+METRICS_PATH = env("DJANGO_METRICS_PATH", "internal/metrics")
+
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, "config.metrics.MetricsMiddleware")
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -74,6 +100,11 @@ TEMPLATES = [
     },
 ]
 
+if API_PROFILE:
+    TEMPLATES[0]["OPTIONS"]["context_processors"].remove(
+        "django.contrib.messages.context_processors.messages"
+    )
+
 WSGI_APPLICATION = "config.wsgi.application"
 
 
@@ -88,9 +119,110 @@ DATABASES = {
         "PORT": env("DJANGO_DB_PORT", 15432),
         "USER": env("DJANGO_DB_USER", "voteoff"),
         "PASSWORD": env("DJANGO_DB_PASSWORD", "voteoff"),
+        "CONN_HEALTH_CHECKS": env.bool("DJANGO_DB_CONN_HEALTH_CHECKS", True),
+    }
+}
+
+# Connection reuse
+# Async views run their queries on a fresh thread per request, so persistent
+# connections (CONN_MAX_AGE) are not reused between requests under ASGI;
+# psycopg's pool is (it needs the psycopg_pool package, psycopg[pool]).
+# CONN_HEALTH_CHECKS also makes the pool check connections it hands out.
+
+if env.bool("DJANGO_DB_POOL", False):
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": env.int("DJANGO_DB_POOL_MIN_SIZE", 2),
+            "max_size": env.int("DJANGO_DB_POOL_MAX_SIZE", 10),
+            "timeout": env.float("DJANGO_DB_POOL_TIMEOUT", 30.0),
+            "max_idle": env.float("DJANGO_DB_POOL_MAX_IDLE", 600.0),
+            "max_lifetime": env.float("DJANGO_DB_POOL_MAX_LIFETIME", 3600.0),
+        }
     }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = env.int("DJANGO_DB_CONN_MAX_AGE", 0)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": env(
+            "DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": env("DJANGO_CACHE_LOCATION", ""),
+    },
 }
+# The local-memory cache otherwise culls past 300 entries, fewer than the
+# ballot tokens of one large event (see VOTE_EVENT_CACHE).
+if CACHES["default"]["BACKEND"] == "django.core.cache.backends.locmem.LocMemCache":
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": env.int("DJANGO_CACHE_MAX_ENTRIES", 100_000)
+    }
+
+
+# API bodies
+# "orjson" is used when orjson is installed (it is not a required dependency)
+# and falls back to the standard library's json otherwise.
+
+API_JSON_BACKEND = env("DJANGO_API_JSON_BACKEND", "orjson")
+
+
+# Vote counting
+# "numpy" is used when numpy is installed (it is not a required dependency)
+# and falls back to the pure-Python counters otherwise.
+
+VOTE_TALLY_BACKEND = env("DJANGO_VOTE_TALLY_BACKEND", "numpy")
+
+VOTE_RESULTS_CACHE = env("DJANGO_VOTE_RESULTS_CACHE", "default")
+VOTE_RESULTS_CACHE_TIMEOUT = env.int("DJANGO_VOTE_RESULTS_CACHE_TIMEOUT", 300)
 
+# Snapshots of events read by polling endpoints, and the ballot tokens found
+# to belong to an event. A change only reaches the snapshots in the cache it
+# was made through. The default local-memory cache is per process, so with
+# several workers each may serve a stale event (with a matching ETag) for up
+# to VOTE_EVENT_CACHE_TIMEOUT: point DJANGO_CACHE_BACKEND at a shared backend
+# such as Redis there (`manage.py check --deploy` warns otherwise). Tokens
+# never move to another event, so they are kept longer.
+VOTE_EVENT_CACHE = env("DJANGO_VOTE_EVENT_CACHE", "default")
+VOTE_EVENT_CACHE_TIMEOUT = env.int("DJANGO_VOTE_EVENT_CACHE_TIMEOUT", 10)
+VOTE_BALLOT_TOKEN_CACHE_TIMEOUT = env.int(
+    "DJANGO_VOTE_BALLOT_TOKEN_CACHE_TIMEOUT", 3600
+)
+
+
+# Live event updates
+# Seconds between state polls of a watched event, and between keepalive
+# comments on otherwise idle streams.
+
+VOTE_LIVE_POLL_INTERVAL = env.float("DJANGO_VOTE_LIVE_POLL_INTERVAL", 1.0)
+VOTE_LIVE_KEEPALIVE = env.float("DJANGO_VOTE_LIVE_KEEPALIVE", 15.0)
+
+# vote.broker.PostgresBroker delivers to WebSocket clients on every worker;
+# vote.broker.InMemoryBroker only within one process.
+VOTE_BROKER = env("DJANGO_VOTE_BROKER", "vote.broker.InMemoryBroker")
+
+
+# Rate limits of create_ballot per event and of submit_ballot, per client IP
+# (see vote/ratelimit.py): BURST requests at once, then RATE per second. The
+# defaults are meant for voters on their own connections. Voters behind one
+# NAT, such as a venue's Wi-Fi, share an IP and so a limit: raise BURST to
+# cover the largest room registering or submitting at once there.
+# vote.ratelimit.CacheRateLimiter shares them between workers through
+# VOTE_RATE_LIMIT_CACHE; vote.ratelimit.InMemoryRateLimiter keeps them per
+# process.
+VOTE_RATE_LIMITER = env(
+    "DJANGO_VOTE_RATE_LIMITER", "vote.ratelimit.InMemoryRateLimiter"
+)
+VOTE_RATE_LIMIT_CACHE = env("DJANGO_VOTE_RATE_LIMIT_CACHE", "default")
+VOTE_RATE_LIMIT_BURST = env.int("DJANGO_VOTE_RATE_LIMIT_BURST", 10)
+VOTE_RATE_LIMIT_RATE = env.float("DJANGO_VOTE_RATE_LIMIT_RATE", 0.5)
+
+# Proxies in front of the app. Clients are identified by the address this
+# many hops back in X-Forwarded-For, or by the connection's address with 0,
+# so they cannot pick their own rate limit bucket.
+NINJA_NUM_PROXIES = env.int("DJANGO_NUM_PROXIES", 0)
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -14,9 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.urls import path
 from .api import api
+from .metrics import metrics
 
 urlpatterns = [
     path("api/", api.urls),
+    path(settings.METRICS_PATH, metrics),
 ]
@@ -0,0 +1,23 @@
+from typing import Any, Optional
+
+from django.http import HttpRequest
+from ninja.security import SessionAuth
+
+
+class AsyncSessionAuth(SessionAuth):
+    """Ninja's ``django_auth`` for async views.
+
+    The session's user is resolved with ``request.auser()``, on the event
+    loop, and becomes ``request.auth`` so views don't load it again.
+    """
+
+    async def authenticate(
+        self, request: HttpRequest, key: Optional[str]
+    ) -> Optional[Any]:
+        user = await request.auser()
+        if user.is_authenticated:
+            return user
+        return None
+
+
+async_django_auth = AsyncSessionAuth()
@@ -1 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
 
+
+class CurrentUserTestCase(TestCase):
+    url = "/api/user/current-user"
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="becky")
+
+    def test_current_user(self):
+        self.client.force_login(self.user)
+        # The session and its user, loaded once by the auth class.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"id": self.user.id})
+
+    async def test_anonymous(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
@@ -2,23 +2,86 @@ from datetime import datetime, UTC
 from typing import List
 
 from django.db import IntegrityError
-from ninja import Header, Router
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from ninja import Header, Query, Router
 from ninja.errors import AuthorizationError, ValidationError, HttpError
 
 from vote.schemas import (
+    BallotRoster,
     BallotSchema,
     BallotSubmission,
     EventCreationResponse,
     EventDetails,
     EventCreation,
+    EventResults,
     EventStatusUpdateBody,
+    VoteFormat,
+)
+from .auth import Role, ballot_role, require_results_access, require_role
+from . import live
+from .broker import get_broker
+from .cache import abump_generation, acached_results, aset_ballot_token_events
+from .encoding import InvalidVote
+from .models import ChoiceTally, Event, Ballot
+from .pagination import (
+    BALLOT_ORDERING,
+    BALLOT_ROW,
+    MAX_PAGE_SIZE,
+    ballot_row,
+    ballots_after,
+    encode_cursor,
+)
+from .queries import (
+    EVENT_CHOICES,
+    EVENT_STATUS,
+    EVENT_TALLY,
+    aget_ballot,
+    aget_event_and_role,
+    aget_event_snapshot,
+    asubmit_ballot,
+    aupdate_event,
+)
+from .ratelimit import acheck_rate_limit
+from .roster import acreate_ballots, parse_roster
+from .streaming import NDJSON_CONTENT_TYPE, json_response, ndjson_response
+from .tally import (
+    UnknownElectoralSystem,
+    new_choice_tallies,
+    tally_event,
 )
-from .models import Event, Ballot
-from django.shortcuts import aget_object_or_404
 import uuid
 
 router = Router()
 
+STREAM_CHUNK_SIZE = 500
+
+
+async def publish_event_update(event: Event):
+    await get_broker().publish(
+        event.id,
+        {
+            "type": "event",
+            "status": event.status,
+            "show_results": event.show_results,
+            "closed": event.closed,
+        },
+    )
+
+
+def event_etag(request, event: Event, variant: str = ""):
+    """The ETag of a response built from ``event`` at its version.
+
+    Every change to an event or its ballots bumps the version (see
+    ``vote.cache``). Also returns a 304 response when the request's
+    If-None-Match already holds the ETag.
+    """
+    etag = f'"{event.id}-{event.version}{variant}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified["ETag"] = etag
+    return etag, not_modified
+
 
 @router.post("/event/create", response={201: EventCreationResponse}, tags=["event"])
 async def create_event(request, payload: EventCreation):
@@ -28,24 +91,72 @@ async def create_event(request, payload: EventCreation):
         electoral_system=payload.electoral_system,
     )
     await event.asave()
+    await ChoiceTally.objects.abulk_create(new_choice_tallies(event))
 
     return 201, event
 
 
 @router.get("/event/{event_id}", response=EventDetails, tags=["event"])
 async def read_event(
-    request, event_id: int, token: uuid.UUID = Header(alias="X-API-Key")
+    request,
+    response: HttpResponse,
+    event_id: int,
+    token: uuid.UUID = Header(alias="X-API-Key"),
+):
+    event, role = await aget_event_snapshot(event_id, token)
+    require_role(role, Role.HOST, Role.SHARE, Role.BALLOT)
+
+    # The snapshot's version, so the ETag always matches the body.
+    response["ETag"], not_modified = event_etag(request, event)
+    return not_modified or event
+
+
+@router.get("/event/{event_id}/stream", tags=["event"])
+async def stream_event(
+    request,
+    event_id: int,
+    token: uuid.UUID | None = Header(None, alias="X-API-Key"),
+    query_token: uuid.UUID | None = Query(None, alias="token"),
 ):
-    event = await aget_object_or_404(Event, pk=event_id)
+    """Server-Sent Events stream of the event's status and ballot counts.
+
+    Browsers' EventSource cannot send headers, so the key may also be given
+    as the ``token`` query parameter.
+    """
+    event, role = await aget_event_snapshot(event_id, token or query_token)
+    require_role(role, Role.HOST, Role.SHARE, Role.BALLOT)
+
+    response = StreamingHttpResponse(
+        live.server_sent_events(event.id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
 
-    if (
-        token != event.share_token
-        and token != event.host_token
-        and token not in [x.token async for x in event.ballot_set.all()]
-    ):
-        raise AuthorizationError
+async def change_event(event_id, token: uuid.UUID, **changes):
+    """Apply a host's change to an event in one conditional UPDATE.
 
-    return event
+    A new ``status`` must be reachable from the current one; see
+    ``Event.TRANSITIONS``.
+    """
+    status = changes.get("status")
+    from_statuses = None
+    if status is not None:
+        from_statuses = Event.statuses_leading_to(status)
+        changes["closed"] = datetime.now(tz=UTC) if status == "CL" else None
+
+    event = await aupdate_event(event_id, token, from_statuses, **changes)
+    if event is None:
+        # Nothing matched; find out why with a read, as the UPDATE can't say.
+        event, role = await aget_event_and_role(event_id, token, EVENT_STATUS)
+        require_role(role, Role.HOST)
+        raise HttpError(
+            409, f"Cannot change event status from {event.status} to {status}."
+        )
+
+    await abump_generation(event.id)
+    await publish_event_update(event)
 
 
 @router.patch("/event/{event_id}/update-status", tags=["event"])
@@ -55,106 +166,121 @@ async def update_event_status(
     body: EventStatusUpdateBody,
     token: uuid.UUID = Header(alias="X-API-Key"),
 ):
-    event = await aget_object_or_404(Event, pk=event_id)
-
-    if token != event.host_token:
-        raise AuthorizationError
-
-    event.status = body.status
-
-    if event.status == event.STATUS_CHOICES.CLOSED:
-        event.closed = datetime.now(tz=UTC)
-    else:
-        event.closed = None
-
-    await event.asave()
+    await change_event(event_id, token, status=body.status)
 
 
 @router.post("/event/{event_id}/close", tags=["event"])
 async def close_event(
     request, event_id: str, token: uuid.UUID = Header(alias="X-API-Key")
 ):
-    event = await aget_object_or_404(Event, pk=event_id)
-
-    if token != event.host_token:
-        raise AuthorizationError
-
-    event.closed = datetime.now(tz=UTC)
-    event.status = event.STATUS_CHOICES.CLOSED
-    await event.asave()
+    await change_event(event_id, token, status=Event.STATUS_CHOICES.CLOSED)
 
 
 @router.post("/event/{event_id}/open", tags=["event"])
 async def open_event(
     request, event_id: str, token: uuid.UUID = Header(alias="X-API-Key")
 ):
-    event = await aget_object_or_404(Event, pk=event_id)
-
-    if token != event.host_token:
-        raise AuthorizationError
-
-    event.closed = None
-    event.status = event.STATUS_CHOICES.VOTING
-    await event.asave()
+    await change_event(event_id, token, status=Event.STATUS_CHOICES.VOTING)
 
 
 @router.post("/event/{event_id}/show-results", tags=["event"])
 async def show_results(
     request, event_id: str, token: uuid.UUID = Header(alias="X-API-Key")
 ):
-    event = await aget_object_or_404(Event, pk=event_id)
-
-    if token != event.host_token:
-        raise AuthorizationError
-
-    event.show_results = True
-    await event.asave()
+    await change_event(event_id, token, show_results=True)
 
 
 @router.post("/event/{event_id}/hide-results", tags=["event"])
 async def hide_results(
     request, event_id: str, token: uuid.UUID = Header(alias="X-API-Key")
 ):
-    event = await aget_object_or_404(Event, pk=event_id)
+    await change_event(event_id, token, show_results=False)
 
-    if token != event.host_token:
-        raise AuthorizationError
 
-    event.show_results = False
-    await event.asave()
+@router.get("/event/{event_id}/results", response=EventResults, tags=["event"])
+async def read_results(
+    request, event_id: str, token: uuid.UUID = Header(alias="X-API-Key")
+):
+    # Read for its current version, which results are cached under.
+    event, role = await aget_event_and_role(event_id, token, EVENT_TALLY)
+    require_results_access(event, role)
+
+    try:
+        return await acached_results(event, lambda: tally_event(event))
+    except UnknownElectoralSystem:
+        raise HttpError(409, "Results are not available for this electoral system.")
 
 
 # Ballots
 @router.get("/event/{event_id}/ballots", response=List[BallotSchema], tags=["ballot"])
 async def list_ballots(
-    request, event_id: str, token: uuid.UUID = Header(alias="X-API-Key")
+    request,
+    event_id: str,
+    token: uuid.UUID = Header(alias="X-API-Key"),
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    vote_format: VoteFormat = "names",
 ):
-    event = await aget_object_or_404(Event, pk=event_id)
-
-    if token != event.host_token and token not in [
-        x.token async for x in event.ballot_set.all()
-    ]:
-        raise AuthorizationError
-
-    if token != event.host_token and (
-        event.status != "CL" or (event.status == "CL" and event.show_results is False)
-    ):
-        raise AuthorizationError
-
-    return [x async for x in event.ballot_set.all().order_by("created", "submitted")]
-
-
-@router.post("/event/{event_id}/create-ballot", tags=["ballot"])
+    """List the event's ballots, optionally a page or a stream at a time.
+
+    With ``limit``, only that many ballots are returned and the
+    ``X-Next-Cursor`` header, when present, is the ``cursor`` of the next
+    page. Clients accepting ``application/x-ndjson`` get one ballot per line,
+    streamed from a server-side cursor. ``vote_format=indices`` gives votes
+    as indices into the event's choices. Responses carry an ETag, and a
+    request whose If-None-Match holds it gets a 304 without any ballots
+    being read.
+
+    Ballots are read as rows and rendered without validating each one
+    against ``BallotSchema``, which stays the documented response.
+    """
+    event, role = await aget_event_and_role(event_id, token, EVENT_TALLY)
+    require_results_access(event, role)
+
+    stream = NDJSON_CONTENT_TYPE in request.headers.get("Accept", "")
+    variant = "-ndjson" if stream else ""
+    etag, not_modified = event_etag(request, event, variant)
+    if not_modified:
+        return not_modified
+
+    ballots = event.ballot_set.order_by(*BALLOT_ORDERING).values(*BALLOT_ROW)
+    if cursor:
+        ballots = ballots_after(ballots, cursor)
+
+    def row(values):
+        return ballot_row(event, values, vote_format)
+
+    if not limit:
+        if stream:
+            rows = ballots.aiterator(chunk_size=STREAM_CHUNK_SIZE)
+            response = ndjson_response(row(x) async for x in rows)
+        else:
+            response = json_response([row(x) async for x in ballots])
+        response["ETag"] = etag
+        return response
+
+    page = [x async for x in ballots[: limit + 1]]
+    rows = [row(x) for x in page[:limit]]
+    response = ndjson_response(rows) if stream else json_response(rows)
+    response["ETag"] = etag
+    if len(page) > limit:
+        response["X-Next-Cursor"] = encode_cursor(page[limit - 1])
+    return response
+
+
+@router.post(
+    "/event/{event_id}/create-ballot",
+    tags=["ballot"],
+)
 async def create_ballot(
     request,
     event_id: str,
     voter_name: str,
     share_token: uuid.UUID = Header(alias="X-API-Key"),
 ):
-    event = await aget_object_or_404(Event, pk=event_id)
-
-    if share_token != event.share_token:
-        raise AuthorizationError
+    await acheck_rate_limit(request, "create_ballot", event_id)
+    event, role = await aget_event_and_role(event_id, share_token, EVENT_STATUS)
+    require_role(role, Role.SHARE)
 
     if event.status != "RE":
         raise HttpError(409, "Cannot create ballot at this time")
@@ -162,6 +288,7 @@ async def create_ballot(
     ballot = Ballot(event=event, voter_name=voter_name)
 
     try:
+        # Saving also bumps the event's version (see vote.cache).
         await ballot.asave()
     except IntegrityError as err:
         if "unique_voter_names_in_event" in str(err):
@@ -169,45 +296,120 @@ async def create_ballot(
         else:
             raise err
 
+    # Lets the submission encode the vote up front (see asubmit_ballot).
+    await aset_ballot_token_events([ballot.token], event.id)
+
+    await get_broker().publish(
+        event.id, {"type": "ballot_created", "ballot_id": ballot.id}
+    )
+
     return {"ballot_id": ballot.id, "ballot_token": ballot.token}
 
 
-@router.post("/ballot/{ballot_id}/submit", response=BallotSchema, tags=["ballot"])
+@router.post(
+    "/event/{event_id}/create-ballots",
+    tags=["ballot"],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": BallotRoster.model_json_schema()},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def create_ballots(
+    request, event_id: str, token: uuid.UUID = Header(alias="X-API-Key")
+):
+    """Register a roster of voters, then stream one NDJSON line per name.
+
+    Each line holds the name and either its ``ballot_id``/``ballot_token``
+    or an ``error`` such as a duplicate name. Every ballot is created before
+    the response starts, so a client going away mid-stream can't leave the
+    roster half registered.
+    """
+    event, role = await aget_event_and_role(event_id, token, EVENT_STATUS)
+    require_role(role, Role.HOST)
+
+    if event.status != "RE":
+        raise HttpError(409, "Cannot create ballot at this time")
+
+    names = parse_roster(request)
+
+    rows = await acreate_ballots(event, names)
+    tokens = [row["ballot_token"] for row in rows if "ballot_token" in row]
+    await aset_ballot_token_events(tokens, event.id)
+    created = len(tokens)
+    if created:
+        await get_broker().publish(
+            event.id, {"type": "ballots_created", "count": created}
+        )
+
+    return ndjson_response(rows)
+
+
+@router.post(
+    "/ballot/{ballot_id}/submit",
+    response=BallotSchema,
+    tags=["ballot"],
+)
 async def submit_ballot(
     request,
     ballot_id: int,
     payload: BallotSubmission,
     token: uuid.UUID = Header(alias="X-API-Key"),
 ):
-    ballot = await aget_object_or_404(
-        Ballot.objects.prefetch_related("event"), pk=ballot_id
+    await acheck_rate_limit(request, "submit_ballot")
+    try:
+        ballot = await asubmit_ballot(
+            ballot_id, token, payload.vote, datetime.now(tz=UTC)
+        )
+    except InvalidVote as err:
+        # The vote may be checked before the ballot; a ballot that cannot be
+        # submitted is refused for that first.
+        if error := await submission_error(ballot_id, token):
+            raise error
+        raise ValidationError([{"loc": ["body", "payload", "vote"], "msg": str(err)}])
+    if ballot is None:
+        # Submittable again since the UPDATE, such as by voting reopening.
+        raise await submission_error(ballot_id, token) or HttpError(
+            409, "Event is not accepting ballots."
+        )
+
+    await get_broker().publish(
+        ballot.event_id, {"type": "ballot_submitted", "ballot_id": ballot.id}
     )
 
-    if ballot.event.status != "VO":
-        raise HttpError(409, "Event is not accepting ballots.")
-
-    if token != ballot.token:
-        raise AuthorizationError
+    return ballot
 
-    if ballot.submitted is not None:
-        raise HttpError(409, "Ballot already submitted.")
 
-    ballot.vote = payload.vote
-    ballot.submitted = datetime.now(tz=UTC)
-    await ballot.asave()
+async def submission_error(ballot_id, token: uuid.UUID) -> HttpError | None:
+    """Why a submission can't be made, checked in the order of the UPDATE.
 
-    return ballot
+    None when it could be, now.
+    """
+    ballot = await aget_ballot(ballot_id, EVENT_STATUS)
+    if ballot.event.status != "VO":
+        return HttpError(409, "Event is not accepting ballots.")
+    if ballot.token != token:
+        return AuthorizationError()
+    if ballot.submitted is not None:
+        return HttpError(409, "Ballot already submitted.")
+    return None
 
 
 @router.get("/ballot/{ballot_id}", response=BallotSchema, tags=["ballot"])
 async def get_ballot(
-    request, ballot_id: int, token: uuid.UUID = Header(alias="X-API-Key")
+    request,
+    response: HttpResponse,
+    ballot_id: int,
+    token: uuid.UUID = Header(alias="X-API-Key"),
+    vote_format: VoteFormat = "names",
 ):
-    ballot = await aget_object_or_404(
-        Ballot.objects.prefetch_related("event"), pk=ballot_id
-    )
+    ballot = await aget_ballot(ballot_id, EVENT_CHOICES)
 
-    if token != ballot.token and token != ballot.event.host_token:
-        raise AuthorizationError
+    require_role(ballot_role(ballot, token), Role.HOST, Role.BALLOT)
 
-    return ballot
+    response["ETag"], not_modified = event_etag(request, ballot.event)
+    return not_modified or ballot
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class VoteConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "vote"
+
+    def ready(self):
+        from . import cache  # noqa: F401 (connects its signal receivers)
+        from . import checks  # noqa: F401 (registers its system checks)
@@ -0,0 +1,60 @@
+from enum import StrEnum
+import uuid
+
+from django.db.models import Exists, OuterRef
+from ninja.errors import AuthorizationError
+
+from .models import Ballot, Event
+
+
+class Role(StrEnum):
+    HOST = "host"
+    SHARE = "share"
+    BALLOT = "ballot"
+    NONE = "none"
+
+
+def events_for_token(token: uuid.UUID):
+    """Events annotated with whether ``token`` belongs to one of their ballots.
+
+    The ballot check is an EXISTS subquery against the unique index on
+    ``Ballot.token``, so resolving a caller's role never loads ballot rows.
+    """
+    return Event.objects.annotate(
+        token_is_ballot=Exists(
+            Ballot.objects.filter(event=OuterRef("pk"), token=token)
+        )
+    )
+
+
+def event_role(event: Event, token: uuid.UUID) -> Role:
+    if token == event.host_token:
+        return Role.HOST
+    if token == event.share_token:
+        return Role.SHARE
+    if getattr(event, "token_is_ballot", False):
+        return Role.BALLOT
+    return Role.NONE
+
+
+def ballot_role(ballot: Ballot, token: uuid.UUID) -> Role:
+    if token == ballot.event.host_token:
+        return Role.HOST
+    if token == ballot.token:
+        return Role.BALLOT
+    return Role.NONE
+
+
+def require_role(role: Role, *allowed: Role):
+    if role not in allowed:
+        raise AuthorizationError
+
+
+def require_results_access(event: Event, role: Role):
+    """Hosts can always see ballots and results, voters only once published."""
+    require_role(role, Role.HOST, Role.BALLOT)
+
+    if role != Role.HOST and (
+        event.status != "CL" or (event.status == "CL" and event.show_results is False)
+    ):
+        raise AuthorizationError
@@ -0,0 +1,127 @@
+"""Publish/subscribe of per-event deltas for live clients.
+
+Endpoints publish a small message whenever they change an event or its
+ballots; WebSocket connections subscribe to the events they watch.
+``settings.VOTE_BROKER`` names the broker class:
+
+``vote.broker.InMemoryBroker``
+    Delivers within the current process only, which is enough for a single
+    worker.
+``vote.broker.PostgresBroker``
+    Relays every message through Postgres ``NOTIFY``, and each process
+    ``LISTEN``s on one dedicated connection, so subscribers on every worker
+    receive messages published on any of them.
+"""
+
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import cache
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+import psycopg
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+
+# Sent instead of the messages a subscriber was too slow to receive.
+OVERFLOW = {"type": "overflow"}
+
+
+@cache
+def get_broker() -> "Broker":
+    return import_string(settings.VOTE_BROKER)()
+
+
+class Broker:
+    async def publish(self, event_id: int, message: dict):
+        raise NotImplementedError
+
+    def subscribe(self, event_id: int):
+        """Async context manager yielding a queue of the event's messages."""
+        raise NotImplementedError
+
+
+class InMemoryBroker(Broker):
+    def __init__(self):
+        self.subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+
+    async def publish(self, event_id, message):
+        self.deliver(event_id, message)
+
+    def deliver(self, event_id, message):
+        for queue in self.subscribers.get(event_id, ()):
+            if queue.full():
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(OVERFLOW)
+            else:
+                queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, event_id):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers[event_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers[event_id].discard(queue)
+            if not self.subscribers[event_id]:
+                del self.subscribers[event_id]
+
+
+class PostgresBroker(InMemoryBroker):
+    channel = "vote_events"
+
+    def __init__(self, using="default"):
+        super().__init__()
+        self.using = using
+        self.listener = None
+
+    async def publish(self, event_id, message):
+        payload = json.dumps(
+            {"event_id": event_id, "message": message}, cls=DjangoJSONEncoder
+        )
+        await sync_to_async(self.notify)(payload)
+
+    def notify(self, payload):
+        # Inside a transaction Postgres only sends the notification on commit.
+        with connections[self.using].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    @asynccontextmanager
+    async def subscribe(self, event_id):
+        if (
+            self.listener is None
+            or self.listener.done()
+            or self.listener.get_loop() is not asyncio.get_running_loop()
+        ):
+            self.listener = asyncio.ensure_future(self.listen())
+        async with super().subscribe(event_id) as queue:
+            yield queue
+
+    async def listen(self):
+        params = connections[self.using].get_connection_params()
+        # Django's cursor factory and adapters are for its sync connections.
+        params.pop("cursor_factory", None)
+        params.pop("context", None)
+
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    **params, autocommit=True
+                ) as connection:
+                    await connection.execute(f"LISTEN {self.channel}")
+                    async for notify in connection.notifies():
+                        payload = json.loads(notify.payload)
+                        self.deliver(payload["event_id"], payload["message"])
+            except Exception:
+                logger.exception("Listening on %s failed", self.channel)
+                await asyncio.sleep(1)
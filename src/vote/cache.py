@@ -0,0 +1,152 @@
+"""Caches of event snapshots and computed results.
+
+Every event has a ``version`` column, bumped in the same statement as each
+change to the event or its ballots: the conditional UPDATEs of
+``vote.queries``, and the save of an event or a ballot outside them (see the
+receivers below). It is the ETag of the event's responses (see
+``api.event_etag``), and results are stored under it, so a change makes
+older entries unreachable rather than deleting them, in every process.
+Concurrent misses for the same key within a process share one computation.
+
+Events themselves are cached as snapshots of the fields polling endpoints
+read, in ``VOTE_EVENT_CACHE``. Reading the version would cost the query a
+snapshot saves, so snapshots are kept under a generation held in that
+cache instead, read before the event is and bumped after every change to
+the event. A snapshot read from the old row while a change was being made
+is stored where no reader looks. A generation that was evicted is restarted
+from the clock, which keeps it above any value it had before. Ballot tokens
+found to belong to an event are remembered too, for longer, as a ballot
+never moves to another event. See the settings for why the cache should be
+shared between workers.
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Ballot, Event
+
+_computations: dict[str, asyncio.Future] = {}
+
+
+def get_cache():
+    return caches[settings.VOTE_RESULTS_CACHE]
+
+
+def get_event_cache():
+    return caches[settings.VOTE_EVENT_CACHE]
+
+
+def snapshot_key(event_id, generation) -> str:
+    return f"vote:event:{event_id}:snapshot:{generation}"
+
+
+def ballot_token_key(token) -> str:
+    return f"vote:ballot-token:{token}:event"
+
+
+async def aget_snapshot(event_id, generation) -> dict | None:
+    return await get_event_cache().aget(snapshot_key(event_id, generation))
+
+
+async def aset_snapshot(event_id, generation, snapshot: dict):
+    await get_event_cache().aset(
+        snapshot_key(event_id, generation),
+        snapshot,
+        settings.VOTE_EVENT_CACHE_TIMEOUT,
+    )
+
+
+async def aget_ballot_token_event(token):
+    return await get_event_cache().aget(ballot_token_key(token))
+
+
+async def aset_ballot_token_event(token, event_id):
+    await aset_ballot_token_events([token], event_id)
+
+
+async def aset_ballot_token_events(tokens, event_id):
+    await get_event_cache().aset_many(
+        {ballot_token_key(token): event_id for token in tokens},
+        settings.VOTE_BALLOT_TOKEN_CACHE_TIMEOUT,
+    )
+
+
+def generation_key(event_id) -> str:
+    return f"vote:event:{event_id}:generation"
+
+
+async def aget_generation(event_id) -> int:
+    cache = get_event_cache()
+    generation = await cache.aget(generation_key(event_id))
+    if generation is None:
+        await cache.aadd(generation_key(event_id), time.time_ns(), timeout=None)
+        generation = await cache.aget(generation_key(event_id))
+    return generation
+
+
+def bump_generation(event_id):
+    cache = get_event_cache()
+    try:
+        cache.incr(generation_key(event_id))
+    except ValueError:
+        cache.add(generation_key(event_id), time.time_ns(), timeout=None)
+
+
+# The async cache methods emulate incr with a get and a set, which could let
+# two changes bump a generation only once.
+abump_generation = sync_to_async(bump_generation)
+
+
+# Changes made outside the API, such as in the admin or a shell. Bulk
+# operations bypass these and bump the version themselves.
+
+
+@receiver(pre_save, sender=Event)
+def bump_saved_event_version(sender, instance, raw=False, **kwargs):
+    # An expression, so the UPDATE can't write back a version read earlier.
+    if not instance._state.adding and not raw:
+        instance.version = F("version") + 1
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def bump_saved_event_generation(sender, instance, **kwargs):
+    bump_generation(instance.pk)
+
+
+@receiver(post_save, sender=Ballot)
+def bump_saved_ballot_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Event.objects.filter(pk=instance.event_id).update(version=F("version") + 1)
+
+
+async def acached_results(event: Event, compute):
+    """Return the cached results of an event, or ``await compute()`` once."""
+    cache = get_cache()
+    key = f"vote:event:{event.id}:results:{event.version}"
+
+    result = await cache.aget(key)
+    if result is not None:
+        return result
+
+    computation = _computations.get(key)
+    if computation is None:
+
+        async def compute_and_store():
+            result = await compute()
+            await cache.aset(key, result, settings.VOTE_RESULTS_CACHE_TIMEOUT)
+            return result
+
+        computation = asyncio.ensure_future(compute_and_store())
+        _computations[key] = computation
+        computation.add_done_callback(lambda _: _computations.pop(key, None))
+
+    # Shielded so a caller going away doesn't cancel the shared computation.
+    return await asyncio.shield(computation)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_event_cache(app_configs, **kwargs):
+    backend = settings.CACHES[settings.VOTE_EVENT_CACHE]["BACKEND"]
+    if backend != "django.core.cache.backends.locmem.LocMemCache":
+        return []
+    return [
+        Warning(
+            "VOTE_EVENT_CACHE is a per-process cache.",
+            hint=(
+                "With several workers, each may serve a stale event for up to "
+                "VOTE_EVENT_CACHE_TIMEOUT. Use a shared backend such as Redis."
+            ),
+            id="vote.W001",
+        )
+    ]
@@ -0,0 +1,90 @@
+"""Compact storage of votes as indices into ``Event.choices``.
+
+``Ballot.ranking`` holds a vote as a ``smallint[]`` of choice indices in
+preference order, so rows and counting no longer carry the choice names.
+The API still speaks the JSON shape clients have always sent: a choice name
+for plurality, a list of names for ranked choice. ``ChoiceLookup.encode``
+accepts that shape, or indices directly, and ``decode_vote`` restores it.
+
+Every vote is validated when it is encoded, by the validator registered for
+the event's ``electoral_system``, so stored rankings can be counted without
+further checks.
+"""
+
+from typing import Any, Callable
+
+VALIDATORS: dict[str, Callable[[list[int], "ChoiceLookup"], None]] = {}
+
+
+class InvalidVote(ValueError):
+    pass
+
+
+def validator(electoral_system: str):
+    def decorator(func):
+        VALIDATORS[electoral_system] = func
+        return func
+
+    return decorator
+
+
+def validate_ranking(ranking: list[int], lookup: "ChoiceLookup"):
+    """Some or all of the choices in preference order, each at most once."""
+    if not ranking:
+        raise InvalidVote("A vote needs at least one choice")
+    if len(set(ranking)) != len(ranking):
+        repeated = next(i for i in ranking if ranking.count(i) > 1)
+        raise InvalidVote(f"{lookup.choices[repeated]!r} is chosen more than once")
+
+
+@validator("PL")
+def validate_plurality(ranking: list[int], lookup: "ChoiceLookup"):
+    if len(ranking) != 1:
+        raise InvalidVote("A plurality vote has exactly one choice")
+
+
+validator("RC")(validate_ranking)
+
+
+class ChoiceLookup:
+    """One event's choices, precompiled for encoding votes in O(len(vote)).
+
+    Systems without a registered validator accept any ranking.
+    """
+
+    def __init__(self, choices: list[str], electoral_system: str):
+        self.choices = tuple(choices)
+        self.electoral_system = electoral_system
+        self.index = {choice: i for i, choice in enumerate(self.choices)}
+        self.validate = VALIDATORS.get(electoral_system, validate_ranking)
+
+    def encode(self, vote: Any) -> list[int]:
+        """Validate ``vote``, given by choice names or indices, into indices."""
+        ranking = []
+        for item in vote if isinstance(vote, list) else [vote]:
+            if isinstance(item, str) and item in self.index:
+                ranking.append(self.index[item])
+            elif isinstance(item, int) and not isinstance(item, bool):
+                if not 0 <= item < len(self.choices):
+                    raise InvalidVote(f"No choice with index {item}")
+                ranking.append(item)
+            else:
+                raise InvalidVote(f"Unknown choice {item!r}")
+        self.validate(ranking, self)
+        return ranking
+
+
+def encode_vote(vote: Any, choices: list[str], electoral_system: str) -> list[int]:
+    return ChoiceLookup(choices, electoral_system).encode(vote)
+
+
+def decode_vote(
+    ranking: list[int] | None, choices: list[str], electoral_system: str
+) -> Any:
+    """The JSON shape of a stored vote: a name for plurality, else names."""
+    if ranking is None:
+        return None
+    names = [choices[i] for i in ranking]
+    if electoral_system == "PL":
+        return names[0] if names else None
+    return names
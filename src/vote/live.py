@@ -0,0 +1,117 @@
+"""In-process fan-out of live event state.
+
+Each event with at least one subscriber in this process gets a single
+``EventWatcher`` task that polls the event's state and hands every change to
+all of its subscribers. Subscribers only ever need the newest state, so each
+one has a queue of size one that a new state replaces.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+import json
+import logging
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+_watchers: dict[int, "EventWatcher"] = {}
+
+_UNKNOWN = object()
+
+
+async def aget_state(event_id: int) -> dict | None:
+    """Current live state of an event, or ``None`` once it no longer exists."""
+    return (
+        await Event.objects.filter(pk=event_id)
+        .annotate(
+            ballots=Count("ballot"),
+            submitted_ballots=Count(
+                "ballot", filter=Q(ballot__submitted__isnull=False)
+            ),
+        )
+        .values("status", "show_results", "closed", "ballots", "submitted_ballots")
+        .afirst()
+    )
+
+
+def offer(queue: asyncio.Queue, state):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(state)
+
+
+class EventWatcher:
+    def __init__(self, event_id: int):
+        self.event_id = event_id
+        self.subscribers: set[asyncio.Queue] = set()
+        self.state = _UNKNOWN
+        self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                state = await aget_state(self.event_id)
+            except Exception:
+                logger.exception("Polling event %s failed", self.event_id)
+                await asyncio.sleep(settings.VOTE_LIVE_POLL_INTERVAL)
+                continue
+
+            if state != self.state:
+                self.state = state
+                for queue in self.subscribers:
+                    offer(queue, state)
+            if state is None:
+                return
+            await asyncio.sleep(settings.VOTE_LIVE_POLL_INTERVAL)
+
+    def add(self, queue: asyncio.Queue):
+        self.subscribers.add(queue)
+        if self.state is not _UNKNOWN:
+            offer(queue, self.state)
+
+
+@asynccontextmanager
+async def subscribe(event_id: int):
+    """Yield a queue receiving the event's state whenever it changes.
+
+    The first state arrives as soon as it is known. ``None`` means the event
+    was deleted and nothing more will follow.
+    """
+    watcher = _watchers.get(event_id)
+    if watcher is None or watcher.task.done():
+        watcher = _watchers[event_id] = EventWatcher(event_id)
+
+    queue = asyncio.Queue(maxsize=1)
+    watcher.add(queue)
+    try:
+        yield queue
+    finally:
+        watcher.subscribers.discard(queue)
+        if not watcher.subscribers:
+            watcher.task.cancel()
+            if _watchers.get(event_id) is watcher:
+                del _watchers[event_id]
+
+
+async def server_sent_events(event_id: int):
+    """Format the event's state changes as a ``text/event-stream`` body."""
+    async with subscribe(event_id) as states:
+        while True:
+            try:
+                state = await asyncio.wait_for(
+                    states.get(), settings.VOTE_LIVE_KEEPALIVE
+                )
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if state is None:
+                yield "event: deleted\ndata: {}\n\n"
+                return
+            data = json.dumps(state, cls=DjangoJSONEncoder)
+            yield f"event: state\ndata: {data}\n\n"
@@ -0,0 +1,80 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from vote.cache import bump_generation
+from vote.models import Ballot, ChoiceTally, Event
+from vote.tally import CHUNK_SIZE, first_choice, new_choice_tallies
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the running ChoiceTally rows of events from their submitted "
+        "ballots, or with --verify report events whose rows are out of date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "event_ids", nargs="*", type=int, help="Events to process (default: all)"
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Compare the running tallies with a recount without writing.",
+        )
+
+    def handle(self, *args, event_ids, verify, **options):
+        events = Event.objects.order_by("pk")
+        if event_ids:
+            events = events.filter(pk__in=event_ids)
+
+        mismatched = []
+        for event in events.iterator():
+            if verify:
+                if recount(event) != stored_counts(event):
+                    mismatched.append(event.pk)
+                    self.stdout.write(f"Event {event.pk}: running tally is stale")
+            else:
+                rebuild(event)
+                self.stdout.write(f"Event {event.pk}: rebuilt")
+
+        if mismatched:
+            raise CommandError(f"{len(mismatched)} event(s) need rebuilding")
+
+
+def recount(event: Event) -> dict[int, int]:
+    counts = Counter(
+        first_choice(ranking)
+        for ranking in Ballot.objects.filter(event=event, submitted__isnull=False)
+        .values_list("ranking", flat=True)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    return {tally.choice: counts[tally.choice] for tally in new_choice_tallies(event)}
+
+
+def stored_counts(event: Event) -> dict[int, int]:
+    return dict(
+        ChoiceTally.objects.filter(event=event).values_list("choice", "votes")
+    )
+
+
+def rebuild(event: Event):
+    # Create missing rows first and commit them, so that submissions from
+    # here on increment them. Locking the rows then holds back concurrent
+    # increments until the recount, which sees every committed submission,
+    # has been written.
+    ChoiceTally.objects.bulk_create(new_choice_tallies(event), ignore_conflicts=True)
+
+    with transaction.atomic():
+        tallies = list(
+            ChoiceTally.objects.select_for_update().filter(event=event)
+        )
+        counts = recount(event)
+        for tally in tallies:
+            tally.votes = counts.get(tally.choice, 0)
+        ChoiceTally.objects.bulk_update(tallies, ["votes"])
+        # Results and their ETags are kept under the version (see vote.cache).
+        Event.objects.filter(pk=event.pk).update(version=F("version") + 1)
+        transaction.on_commit(lambda: bump_generation(event.pk))
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vote', '0007_alter_event_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChoiceTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('choice', models.SmallIntegerField()),
+                ('votes', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='vote.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'choice'), name='unique_choice_tallies_in_event')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:39
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking writes to large existing tables.
+    atomic = False
+
+    dependencies = [
+        ('vote', '0008_choicetally'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ballot',
+            index=models.Index(fields=['event', 'created', 'submitted'], name='ballot_event_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ballot',
+            index=models.Index(condition=models.Q(('submitted__isnull', False)), fields=['event'], name='ballot_event_submitted_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['share_token'], name='event_share_token_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['host_token'], name='event_host_token_idx'),
+        ),
+    ]
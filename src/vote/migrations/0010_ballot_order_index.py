@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:41
+
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the new index before dropping the old one, without locking writes.
+    atomic = False
+
+    dependencies = [
+        ('vote', '0009_vote_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ballot',
+            index=models.Index(fields=['event', 'created', 'submitted', 'id'], name='ballot_event_order_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='ballot',
+            name='ballot_event_created_idx',
+        ),
+    ]
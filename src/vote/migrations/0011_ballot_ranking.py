@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:56
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def votes_to_rankings(apps, schema_editor):
+    # Stored votes were never validated. Like the counters always did, keep
+    # the known choices in order, once each; plurality keeps the first.
+    Ballot = apps.get_model("vote", "Ballot")
+    ballots = Ballot.objects.filter(vote__isnull=False).select_related("event")
+    batch = []
+    for ballot in ballots.iterator(chunk_size=BATCH_SIZE):
+        lookup = {choice: i for i, choice in enumerate(ballot.event.choices)}
+        vote = ballot.vote if isinstance(ballot.vote, list) else [ballot.vote]
+        ranking = []
+        for choice in vote:
+            index = lookup.get(choice) if isinstance(choice, str) else None
+            if index is not None and index not in ranking:
+                ranking.append(index)
+        if ballot.event.electoral_system == "PL":
+            ranking = ranking[:1]
+        ballot.ranking = ranking
+        batch.append(ballot)
+        if len(batch) == BATCH_SIZE:
+            Ballot.objects.bulk_update(batch, ["ranking"])
+            batch = []
+    Ballot.objects.bulk_update(batch, ["ranking"])
+
+
+def rankings_to_votes(apps, schema_editor):
+    Ballot = apps.get_model("vote", "Ballot")
+    ballots = Ballot.objects.filter(ranking__isnull=False).select_related("event")
+    batch = []
+    for ballot in ballots.iterator(chunk_size=BATCH_SIZE):
+        names = [ballot.event.choices[i] for i in ballot.ranking]
+        if ballot.event.electoral_system == "PL":
+            ballot.vote = names[0] if names else None
+        else:
+            ballot.vote = names
+        batch.append(ballot)
+        if len(batch) == BATCH_SIZE:
+            Ballot.objects.bulk_update(batch, ["vote"])
+            batch = []
+    Ballot.objects.bulk_update(batch, ["vote"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vote', '0010_ballot_order_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ballot',
+            name='ranking',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.SmallIntegerField(), null=True, size=None),
+        ),
+        migrations.RunPython(votes_to_rankings, rankings_to_votes),
+        migrations.RemoveField(
+            model_name='ballot',
+            name='vote',
+        ),
+    ]
@@ -1,6 +1,9 @@
 import uuid
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import Index, Q, UniqueConstraint
+
+from .encoding import decode_vote, encode_vote
 
 
 class Event(models.Model):
@@ -9,6 +12,15 @@ class Event(models.Model):
         VOTING = "VO", "Voting"
         CLOSED = "CL", "Closed"
 
+    # Statuses a host may move an event to from each status, besides the
+    # one it is in. Reopening a closed event resumes voting; registration
+    # does not reopen once voting has ended.
+    TRANSITIONS = {
+        "RE": {"VO", "CL"},
+        "VO": {"RE", "CL"},
+        "CL": {"VO"},
+    }
+
     share_token = models.UUIDField(default=uuid.uuid4, editable=False)
     host_token = models.UUIDField(default=uuid.uuid4, editable=False)
     name = models.CharField()
@@ -18,6 +30,24 @@ class Event(models.Model):
     closed = models.DateTimeField(null=True)
     electoral_system = models.CharField(max_length=2)
     status = models.CharField(max_length=2, choices=STATUS_CHOICES, default="RE")
+    # Bumped with every change to the event or its ballots; responses' ETags
+    # and cached results are keyed by it (see vote.cache).
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            Index(fields=["share_token"], name="event_share_token_idx"),
+            Index(fields=["host_token"], name="event_host_token_idx"),
+        ]
+
+    @classmethod
+    def statuses_leading_to(cls, status: str) -> list[str]:
+        """Statuses from which an event may move to ``status``."""
+        return [
+            source
+            for source, targets in cls.TRANSITIONS.items()
+            if source == status or status in targets
+        ]
 
 
 class Ballot(models.Model):
@@ -26,7 +56,8 @@ class Ballot(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     voter_name = models.CharField()
     created = models.DateTimeField(auto_now_add=True)
-    vote = models.JSONField(null=True)
+    # Choice indices in preference order; see vote.encoding.
+    ranking = ArrayField(models.SmallIntegerField(), null=True)
     submitted = models.DateTimeField(null=True)
 
     class Meta:
@@ -35,3 +66,52 @@ class Ballot(models.Model):
                 fields=["voter_name", "event"], name="unique_voter_names_in_event"
             ),
         ]
+        indexes = [
+            # list_ballots' ordering and keyset pagination within an event.
+            Index(
+                fields=["event", "created", "submitted", "id"],
+                name="ballot_event_order_idx",
+            ),
+            # Counting only reads submitted ballots.
+            Index(
+                fields=["event"],
+                condition=Q(submitted__isnull=False),
+                name="ballot_event_submitted_idx",
+            ),
+        ]
+
+    @property
+    def vote(self):
+        """The vote in its JSON shape, decoded with the event's choices."""
+        return decode_vote(
+            self.ranking, self.event.choices, self.event.electoral_system
+        )
+
+    @vote.setter
+    def vote(self, vote):
+        self.ranking = (
+            None
+            if vote is None
+            else encode_vote(vote, self.event.choices, self.event.electoral_system)
+        )
+
+
+class ChoiceTally(models.Model):
+    """Running count of submitted first preferences for one choice.
+
+    ``choice`` is an index into ``Event.choices``; ballots without a valid
+    first preference are counted under ``EXHAUSTED``.
+    """
+
+    EXHAUSTED = -1
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    choice = models.SmallIntegerField()
+    votes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=["event", "choice"], name="unique_choice_tallies_in_event"
+            ),
+        ]
@@ -0,0 +1,241 @@
+"""Loaders fetching exactly the rows and columns each vote endpoint needs.
+
+Every loader is a single query: a ballot comes with its event through a
+join rather than a second lookup, and the caller's role for an event is
+resolved in the same statement (see ``auth.events_for_token``). The column
+sets below name what an endpoint reads; touching a column outside its set
+costs an extra query per row, which the query-count tests catch. Polled
+endpoints read events through ``aget_event_snapshot``, which is usually
+answered from the cache without any query.
+
+Writes that depend on the current state of a row are single conditional
+statements, so concurrent requests cannot both pass a check made in Python.
+They bump the event's version in the same statement (see ``vote.cache``).
+"""
+
+from datetime import datetime
+from typing import Any
+import threading
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.shortcuts import aget_object_or_404
+
+from .auth import Role, event_role, events_for_token
+from .cache import (
+    aget_ballot_token_event,
+    aget_generation,
+    aget_snapshot,
+    aset_ballot_token_event,
+    aset_snapshot,
+)
+from .encoding import ChoiceLookup
+from .models import Ballot, Event
+from .tally import record_vote
+
+# Resolving a role only compares tokens.
+EVENT_ROLE = ("id", "host_token", "share_token")
+# Gating ballot creation and submission.
+EVENT_STATUS = (*EVENT_ROLE, "status")
+# require_results_access(), live updates and ETags.
+EVENT_STATE = (*EVENT_STATUS, "show_results", "closed", "version")
+# Decoding votes, and a ballot's ETag.
+EVENT_CHOICES = (*EVENT_ROLE, "electoral_system", "choices", "version")
+# Counting votes and listing them.
+EVENT_TALLY = (*EVENT_STATE, "electoral_system", "choices")
+# The EventDetails response.
+EVENT_DETAILS = (*EVENT_TALLY, "name")
+
+BALLOT = ("id", "event_id", "token", "voter_name", "ranking", "created", "submitted")
+
+
+async def aget_event_and_role(
+    event_id, token: uuid.UUID, fields=EVENT_DETAILS
+) -> tuple[Event, Role]:
+    """Load an event's ``fields`` and the caller's role for it."""
+    event = await aget_object_or_404(
+        events_for_token(token).only(*fields), pk=event_id
+    )
+    return event, event_role(event, token)
+
+
+async def aget_event_snapshot(event_id, token: uuid.UUID) -> tuple[Event, Role]:
+    """``aget_event_and_role`` for ``EVENT_DETAILS``, read through the cache.
+
+    A cached snapshot resolves host and share tokens without a query. Any
+    other token is looked up among the event's ballots, and remembered once
+    found there. Snapshots are kept under the generation read before the
+    event is (see ``vote.cache``).
+    """
+    # Ids come from the URL, where "05" is event 5 too.
+    event_id = int(event_id)
+    generation = await aget_generation(event_id)
+    snapshot = await aget_snapshot(event_id, generation)
+    if snapshot is None:
+        event, role = await aget_event_and_role(event_id, token)
+        snapshot = {field: getattr(event, field) for field in EVENT_DETAILS}
+        await aset_snapshot(event.id, generation, snapshot)
+    else:
+        event = Event(**snapshot)
+        role = event_role(event, token)
+        if role == Role.NONE:
+            if await aget_ballot_token_event(token) == event.id:
+                return event, Role.BALLOT
+            if await Ballot.objects.filter(event_id=event.id, token=token).aexists():
+                role = Role.BALLOT
+    if role == Role.BALLOT:
+        await aset_ballot_token_event(token, event.id)
+    return event, role
+
+
+def ballots_with_event(fields=EVENT_ROLE):
+    """Ballots joined to their event's ``fields``."""
+    return Ballot.objects.select_related("event").only(
+        *BALLOT, *(f"event__{field}" for field in fields)
+    )
+
+
+async def aget_ballot(ballot_id, fields=EVENT_ROLE) -> Ballot:
+    return await aget_object_or_404(ballots_with_event(fields), pk=ballot_id)
+
+
+# Precompiled lookups kept for this many events per process.
+CHOICE_LOOKUPS = 1024
+
+_choice_lookups: dict[int, ChoiceLookup] = {}
+_choice_lookups_lock = threading.Lock()
+
+
+def choice_lookup(event_id: int, choices, electoral_system: str) -> ChoiceLookup:
+    """The event's choice lookup, compiled once; choices never change.
+
+    ``choices`` is the column as the database returned it, decoded on a miss.
+    """
+    lookup = _choice_lookups.get(event_id)
+    if lookup is None:
+        choices = Event._meta.get_field("choices").from_db_value(
+            choices, None, connection
+        )
+        lookup = ChoiceLookup(choices, electoral_system)
+        # Submissions run in worker threads, which may evict at once.
+        with _choice_lookups_lock:
+            if len(_choice_lookups) >= CHOICE_LOOKUPS:
+                del _choice_lookups[next(iter(_choice_lookups))]
+            _choice_lookups[event_id] = lookup
+    return lookup
+
+
+SUBMIT_BALLOT = """
+    WITH submitted AS (
+        UPDATE {ballot} SET submitted = %s{ranking}
+        FROM {event}
+        WHERE {ballot}.id = %s
+            AND {ballot}.token = %s
+            AND {ballot}.submitted IS NULL
+            AND {event}.id = {ballot}.event_id
+            AND {event}.status = 'VO'{event_condition}
+        RETURNING {ballot}.*,
+            {event}.choices AS event_choices,
+            {event}.electoral_system AS event_electoral_system
+    ), bumped AS (
+        UPDATE {event} SET version = version + 1
+        FROM submitted
+        WHERE {event}.id = submitted.event_id
+    )
+    SELECT * FROM submitted
+"""
+
+
+def submit_ballot_sql(encoded: bool) -> str:
+    return SUBMIT_BALLOT.format(
+        ballot=Ballot._meta.db_table,
+        event=Event._meta.db_table,
+        ranking=", ranking = %s" if encoded else "",
+        event_condition=f" AND {Event._meta.db_table}.id = %s" if encoded else "",
+    )
+
+
+async def asubmit_ballot(
+    ballot_id: int, token: uuid.UUID, vote: Any, submitted: datetime
+) -> Ballot | None:
+    """Submit the ballot if ``token`` is its own and its event is voting.
+
+    When the token's event and its ``choice_lookup`` are cached, the vote is
+    validated and encoded first, and one statement checks the ballot and its
+    event, writes the ranking and bumps the event's version. Otherwise that
+    statement returns the event's choices, and the vote is validated and its
+    ranking written once the ballot is known to be submittable. Either way
+    the running tally is updated in the same transaction. ``InvalidVote``
+    may therefore be raised for a ballot that cannot be submitted.
+    Returns None when nothing was submitted.
+    """
+    event_id = await aget_ballot_token_event(token)
+    lookup = _choice_lookups.get(event_id)
+    ranking = None if lookup is None else lookup.encode(vote)
+    return await _submit_ballot(ballot_id, token, vote, submitted, event_id, ranking)
+
+
+@sync_to_async
+@transaction.atomic
+def _submit_ballot(ballot_id, token, vote, submitted, event_id, ranking):
+    if ranking is None:
+        sql, params = submit_ballot_sql(False), [submitted, ballot_id, token]
+    else:
+        sql = submit_ballot_sql(True)
+        params = [submitted, ranking, ballot_id, token, event_id]
+    ballot = next(iter(Ballot.objects.raw(sql, params)), None)
+    if ballot is None:
+        return None
+
+    lookup = choice_lookup(
+        ballot.event_id, ballot.event_choices, ballot.event_electoral_system
+    )
+    if ranking is None:
+        ballot.ranking = lookup.encode(vote)
+        Ballot.objects.filter(pk=ballot.id).update(ranking=ballot.ranking)
+    ballot.event = Event(
+        id=ballot.event_id,
+        choices=list(lookup.choices),
+        electoral_system=lookup.electoral_system,
+    )
+    record_vote(ballot.event, ballot.ranking)
+    return ballot
+
+
+UPDATE_EVENT = """
+    UPDATE {event} SET {assignments}, version = version + 1
+    WHERE id = %s AND host_token = %s{condition}
+    RETURNING id, status, show_results, closed, version
+"""
+
+
+@sync_to_async
+def aupdate_event(
+    event_id, token: uuid.UUID, from_statuses=None, **changes
+) -> Event | None:
+    """Write ``changes`` to the event if ``token`` is its host's.
+
+    With ``from_statuses``, the event must also be in one of them. Only the
+    changed columns are written, so concurrent changes to other fields are
+    kept, and the version is bumped. Returns the event's live-update fields
+    and version, or None when nothing matched.
+    """
+    assignments, params = [], []
+    for name, value in changes.items():
+        field = Event._meta.get_field(name)
+        assignments.append(f"{connection.ops.quote_name(field.column)} = %s")
+        params.append(field.get_db_prep_save(value, connection))
+    params += [Event._meta.pk.get_prep_value(event_id), token]
+
+    condition = ""
+    if from_statuses is not None:
+        condition = " AND status = ANY(%s)"
+        params.append(list(from_statuses))
+
+    sql = UPDATE_EVENT.format(
+        event=Event._meta.db_table,
+        assignments=", ".join(assignments),
+        condition=condition,
+    )
+    return next(iter(Event.objects.raw(sql, params)), None)
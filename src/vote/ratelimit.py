@@ -0,0 +1,152 @@
+"""Rate limits for the endpoints anyone with a link can call.
+
+Each client IP gets a bucket per event for ``create_ballot``, keyed by the
+id parsed from the URL so "05" and "5" share one, and a single bucket for
+``submit_ballot``, so walking through ballot ids doesn't reset it. A bucket
+lets ``VOTE_RATE_LIMIT_BURST`` requests through at once and
+``VOTE_RATE_LIMIT_RATE`` per second after that. Views call
+``acheck_rate_limit`` before anything else, so rejected requests get a 429
+without touching the database. Behind proxies, set ``DJANGO_NUM_PROXIES`` so
+the client IP is read from X-Forwarded-For.
+
+``InMemoryRateLimiter`` keeps token buckets per process. ``CacheRateLimiter``
+shares the limits between workers through ``VOTE_RATE_LIMIT_CACHE``. The
+cache can't update a token bucket atomically, so it counts requests in fixed
+windows of BURST / RATE seconds with ``incr`` instead; a client may get up
+to twice the burst through around the end of a window.
+"""
+
+from functools import cache
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from ninja.errors import Throttled
+
+# In-memory buckets kept before the full ones are dropped.
+MAX_BUCKETS = 10_000
+
+
+@cache
+def get_rate_limiter() -> "RateLimiter":
+    return import_string(settings.VOTE_RATE_LIMITER)()
+
+
+class RateLimiter:
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self):
+        self.burst = settings.VOTE_RATE_LIMIT_BURST
+        self.rate = settings.VOTE_RATE_LIMIT_RATE
+
+    async def atake(self, key: str) -> float:
+        """Count a request against ``key``'s limit.
+
+        Returns 0 when it is allowed, else the seconds until one would be.
+        """
+        raise NotImplementedError
+
+
+class InMemoryRateLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__()
+        self.buckets: dict[str, tuple[float, float]] = {}
+        self.lock = threading.Lock()
+
+    async def atake(self, key):
+        # Only memory is touched, so this doesn't block the event loop.
+        return self.take(key)
+
+    def take(self, key: str) -> float:
+        now = self.clock()
+        with self.lock:
+            tokens, wait = self.spend(self.refill(self.buckets.get(key), now))
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > MAX_BUCKETS:
+                self.prune(now)
+        return wait
+
+    def refill(self, bucket: tuple[float, float] | None, now: float) -> float:
+        if bucket is None:
+            return self.burst
+        tokens, updated = bucket
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def spend(self, tokens: float) -> tuple[float, float]:
+        """The tokens left and the wait, after trying to spend one."""
+        if tokens >= 1:
+            return tokens - 1, 0.0
+        return tokens, (1 - tokens) / self.rate
+
+    def prune(self, now: float):
+        # A full bucket is the same as no bucket.
+        self.buckets = {
+            key: bucket
+            for key, bucket in self.buckets.items()
+            if self.refill(bucket, now) < self.burst
+        }
+
+
+class CacheRateLimiter(RateLimiter):
+    """Fixed windows counted with the cache's ``incr``.
+
+    ``incr`` is atomic on Redis, Memcached and the local-memory cache, so
+    workers never overwrite each other's counts there. The database cache
+    reads and writes instead, and may let a few concurrent requests more
+    through.
+    """
+
+    # Shared between hosts, so not a monotonic clock.
+    clock = staticmethod(time.time)
+
+    async def atake(self, key):
+        now = self.clock()
+        window = self.burst / self.rate
+        index = int(now // window)
+        # Kept until the window is over.
+        count = await self.acount(f"vote:ratelimit:{key}:{index}", int(window) + 1)
+        if count <= self.burst:
+            return 0.0
+        return (index + 1) * window - now
+
+    @sync_to_async
+    def acount(self, cache_key: str, timeout: int) -> int:
+        # The async cache methods emulate incr with a get and a set, so the
+        # synchronous ones run in a thread instead.
+        store = caches[settings.VOTE_RATE_LIMIT_CACHE]
+        store.add(cache_key, 0, timeout)
+        try:
+            return store.incr(cache_key)
+        except ValueError:
+            # Evicted since it was added.
+            store.add(cache_key, 1, timeout)
+            return 1
+
+
+def client_ip(request) -> str | None:
+    """The client's address, ``NINJA_NUM_PROXIES`` hops back in X-Forwarded-For."""
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if not settings.NINJA_NUM_PROXIES or forwarded is None:
+        return request.META.get("REMOTE_ADDR")
+    addresses = forwarded.split(",")
+    return addresses[-min(settings.NINJA_NUM_PROXIES, len(addresses))].strip()
+
+
+async def acheck_rate_limit(request, scope: str, object_id=None):
+    """Raise ``Throttled`` when the client is over its limit for ``scope``.
+
+    With ``object_id``, the client has a limit per object; ids that aren't
+    numbers share one.
+    """
+    if object_id is not None:
+        try:
+            object_id = int(object_id)
+        except ValueError:
+            object_id = None
+    key = f"{scope}:{object_id}:{client_ip(request)}"
+    wait = await get_rate_limiter().atake(key)
+    if wait:
+        raise Throttled(wait=wait)
@@ -0,0 +1,102 @@
+"""Bulk creation of ballots from a roster of voter names."""
+
+import csv
+import io
+
+from django.db import IntegrityError
+from django.db.models import F
+from ninja.errors import ValidationError
+import pydantic
+
+from .models import Ballot, Event
+from .schemas import BallotRoster
+
+BATCH_SIZE = 500
+MAX_ROSTER_SIZE = 10000
+
+DUPLICATE = "Duplicate voter name"
+
+
+def parse_roster(request) -> list[str]:
+    """Voter names from a JSON ``BallotRoster`` or a CSV body.
+
+    CSV rows contribute their first cell; blank rows and a ``voter_name``
+    header are skipped.
+    """
+    if request.content_type == "text/csv":
+        try:
+            rows = csv.reader(io.StringIO(request.body.decode("utf-8-sig")))
+            names = [row[0].strip() for row in rows if row and row[0].strip()]
+        except (UnicodeDecodeError, csv.Error) as err:
+            raise ValidationError([{"loc": ["body"], "msg": str(err)}])
+        if names and names[0] == "voter_name":
+            names = names[1:]
+    else:
+        try:
+            names = BallotRoster.model_validate_json(request.body).voter_names
+        except pydantic.ValidationError as err:
+            raise ValidationError(err.errors(include_url=False))
+
+    if len(names) > MAX_ROSTER_SIZE:
+        raise ValidationError(
+            [{"loc": ["body"], "msg": f"At most {MAX_ROSTER_SIZE} voter names"}]
+        )
+    return names
+
+
+async def acreate_ballots(event: Event, names: list[str]) -> list[dict]:
+    """Create a ballot per name, returning one result row per name in order.
+
+    Names already on the event, or repeated in the roster, are reported as
+    duplicates instead of failing the whole roster. Each batch is one lookup
+    of existing names, one multi-row INSERT and the bump of the event's
+    version.
+    """
+    rows, seen = [], set()
+    for start in range(0, len(names), BATCH_SIZE):
+        batch = names[start : start + BATCH_SIZE]
+        existing = {
+            name
+            async for name in Ballot.objects.filter(
+                event=event, voter_name__in=batch
+            ).values_list("voter_name", flat=True)
+        }
+
+        ballots = {}
+        for name in batch:
+            if name not in seen and name not in existing:
+                ballots[name] = Ballot(event=event, voter_name=name)
+            seen.add(name)
+
+        try:
+            await Ballot.objects.abulk_create(ballots.values())
+        except IntegrityError:
+            # Lost a race with a concurrent registration; the failed INSERT
+            # wrote nothing, so fall back to one row at a time. Each save
+            # bumps the event's version.
+            for name, ballot in list(ballots.items()):
+                try:
+                    await ballot.asave()
+                except IntegrityError:
+                    del ballots[name]
+        else:
+            if ballots:
+                await Event.objects.filter(pk=event.id).aupdate(
+                    version=F("version") + 1
+                )
+
+        created = set()
+        for name in batch:
+            ballot = ballots.get(name)
+            if ballot is None or name in created:
+                rows.append({"voter_name": name, "error": DUPLICATE})
+            else:
+                created.add(name)
+                rows.append(
+                    {
+                        "voter_name": name,
+                        "ballot_id": ballot.id,
+                        "ballot_token": ballot.token,
+                    }
+                )
+    return rows
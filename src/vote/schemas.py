@@ -7,6 +7,8 @@ from vote.models import Ballot
 
 type EventStatus = Literal["RE", "CL", "VO"]
 
+type VoteFormat = Literal["names", "indices"]
+
 
 class EventStatusUpdateBody(Schema):
     status: EventStatus
@@ -31,10 +33,38 @@ class EventCreationResponse(EventDetails):
 
 
 class BallotSchema(ModelSchema):
+    vote: Any = None
+
     class Meta:
         model = Ballot
-        fields = ["id", "voter_name", "vote", "created", "submitted"]
+        fields = ["id", "voter_name", "created", "submitted"]
+
+    @staticmethod
+    def resolve_vote(ballot, context):
+        # vote_format=indices sends the stored choice indices instead.
+        request = (context or {}).get("request")
+        if request is not None and request.GET.get("vote_format") == "indices":
+            return ballot.ranking
+        return ballot.vote
+
+
+class BallotRoster(Schema):
+    voter_names: List[str]
 
 
 class BallotSubmission(Schema):
-    vote: Any
+    # Choice names or indices into the event's choices.
+    vote: str | int | List[str | int]
+
+
+class ResultRound(Schema):
+    tallies: dict[str, int]
+    exhausted: int
+    eliminated: List[str]
+
+
+class EventResults(Schema):
+    electoral_system: str
+    ballots: int
+    rounds: List[ResultRound]
+    winners: List[str]
@@ -0,0 +1,27 @@
+from django.http import HttpResponse, StreamingHttpResponse
+
+from config.renderers import dumps
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+
+
+def json_response(data, status=200) -> HttpResponse:
+    """``data`` rendered as the API renders it, without a response schema."""
+    return HttpResponse(dumps(data), status=status, content_type=JSON_CONTENT_TYPE)
+
+
+async def ndjson_lines(rows):
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield dumps(row) + b"\n"
+    else:
+        for row in rows:
+            yield dumps(row) + b"\n"
+
+
+def ndjson_response(rows, status=200) -> StreamingHttpResponse:
+    """Stream an iterable or async iterable of JSON rows, one per line."""
+    return StreamingHttpResponse(
+        ndjson_lines(rows), status=status, content_type=NDJSON_CONTENT_TYPE
+    )
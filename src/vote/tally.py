@@ -0,0 +1,256 @@
+"""Server-side vote counting.
+
+Each electoral system has a ``Tally`` subclass registered under its
+``Event.electoral_system`` code. A tally is fed every submitted ballot's
+``ranking`` once, in a single pass, and then produces round-by-round results.
+Stored rankings were validated on submission (see ``vote.encoding``), so they
+are counted as they are, without per-ballot checks. Counters only keep
+aggregates (per-choice counts, or grouped rankings for ranked choice), never
+the ballots themselves.
+
+Submitted first preferences are also kept as running ``ChoiceTally`` rows,
+updated in the same transaction as each submission, so plurality results can
+be read without touching the ballots at all.
+
+A system can have several counting backends giving identical results. The
+pure-Python ``"python"`` backend always exists; ``settings.VOTE_TALLY_BACKEND``
+picks another one where it is registered, such as the NumPy instant-runoff
+counter in ``vote.tally_numpy``.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import Ballot, ChoiceTally, Event
+
+TALLIES: dict[str, dict[str, type["Tally"]]] = {}
+
+CHUNK_SIZE = 2000
+
+
+class UnknownElectoralSystem(LookupError):
+    pass
+
+
+@dataclass
+class Round:
+    tallies: dict[str, int]
+    exhausted: int = 0
+    eliminated: list[str] = field(default_factory=list)
+
+
+@dataclass
+class TallyResult:
+    electoral_system: str
+    ballots: int
+    rounds: list[Round]
+    winners: list[str]
+
+
+def register(electoral_system: str, backend: str = "python"):
+    def decorator(cls):
+        cls.electoral_system = electoral_system
+        TALLIES.setdefault(electoral_system, {})[backend] = cls
+        return cls
+
+    return decorator
+
+
+def get_tally(
+    electoral_system: str, choices: list[str], backend: str | None = None
+) -> "Tally":
+    try:
+        backends = TALLIES[electoral_system]
+    except KeyError:
+        raise UnknownElectoralSystem(electoral_system) from None
+
+    backend = backend or settings.VOTE_TALLY_BACKEND
+    return backends.get(backend, backends["python"])(choices)
+
+
+def first_choice(ranking: list[int] | None) -> int:
+    return ranking[0] if ranking else ChoiceTally.EXHAUSTED
+
+
+class Tally:
+    electoral_system: str
+    # Whether results can be served from the running ChoiceTally rows.
+    running = False
+
+    def __init__(self, choices: list[str]):
+        self.choices = list(choices)
+        self.ballots = 0
+
+    def add_encoded(self, ranking: list[int] | None):
+        """Count a stored ``Ballot.ranking``."""
+        self.ballots += 1
+        self.add_ranking(tuple(ranking) if ranking else ())
+
+    def add_ranking(self, preferences: tuple[int, ...]):
+        raise NotImplementedError
+
+    def rounds(self) -> tuple[list[Round], list[str]]:
+        raise NotImplementedError
+
+    def result(self) -> TallyResult:
+        rounds, winners = self.rounds()
+        return TallyResult(
+            electoral_system=self.electoral_system,
+            ballots=self.ballots,
+            rounds=rounds,
+            winners=winners,
+        )
+
+
+@register("PL")
+class PluralityTally(Tally):
+    running = True
+
+    def __init__(self, choices):
+        super().__init__(choices)
+        self.counts = [0] * len(self.choices)
+        self.exhausted = 0
+
+    def load_running_tally(self, counts: dict[int, int]):
+        self.counts = [counts.get(i, 0) for i in range(len(self.choices))]
+        self.exhausted = counts.get(ChoiceTally.EXHAUSTED, 0)
+        self.ballots = sum(counts.values())
+        return self
+
+    def add_ranking(self, preferences):
+        if preferences:
+            self.counts[preferences[0]] += 1
+        else:
+            self.exhausted += 1
+
+    def rounds(self):
+        top = max(self.counts, default=0)
+        winners = [c for c, n in zip(self.choices, self.counts) if top and n == top]
+        round_ = Round(
+            tallies=dict(zip(self.choices, self.counts)), exhausted=self.exhausted
+        )
+        return [round_], winners
+
+
+def instant_runoff_round(counts, continuing, active):
+    """Decide one instant-runoff round.
+
+    ``counts`` holds the first continuing preference count of every choice in
+    ``continuing``. Returns ``(winners, eliminated)``; exactly one of them is
+    empty unless the count is over with no winner. All choices tied for last
+    place are eliminated together, unless that would eliminate everyone, in
+    which case they share the win.
+    """
+    if active == 0:
+        return [], []
+
+    top = max(counts[i] for i in continuing)
+    if top * 2 > active or len(continuing) == 1:
+        return [i for i in continuing if counts[i] == top], []
+
+    bottom = min(counts[i] for i in continuing)
+    eliminated = [i for i in continuing if counts[i] == bottom]
+    if len(eliminated) == len(continuing):
+        return eliminated, []
+    return [], eliminated
+
+
+@register("RC")
+class InstantRunoffTally(Tally):
+    def __init__(self, choices):
+        super().__init__(choices)
+        self.rankings = Counter()
+
+    def add_ranking(self, preferences):
+        self.rankings[preferences] += 1
+
+    def first_round_counts(self) -> list[int]:
+        self.eliminated = set()
+        return self.count()
+
+    def redistribute(self, eliminated: list[int]) -> list[int]:
+        """Per-choice counts once ``eliminated`` are out of the running."""
+        self.eliminated.update(eliminated)
+        return self.count()
+
+    def count(self):
+        counts = [0] * len(self.choices)
+        for preferences, weight in self.rankings.items():
+            for index in preferences:
+                if index not in self.eliminated:
+                    counts[index] += weight
+                    break
+        return counts
+
+    def rounds(self):
+        continuing = list(range(len(self.choices)))
+        counts = self.first_round_counts()
+        rounds = []
+
+        while True:
+            active = sum(counts)
+            winners, eliminated = instant_runoff_round(counts, continuing, active)
+            rounds.append(
+                Round(
+                    tallies={self.choices[i]: counts[i] for i in continuing},
+                    exhausted=self.ballots - active,
+                    eliminated=[self.choices[i] for i in eliminated],
+                )
+            )
+            if not eliminated:
+                return rounds, [self.choices[i] for i in winners]
+            continuing = [i for i in continuing if i not in eliminated]
+            counts = self.redistribute(eliminated)
+
+
+def new_choice_tallies(event: Event) -> list[ChoiceTally]:
+    choices = [*range(len(event.choices)), ChoiceTally.EXHAUSTED]
+    return [ChoiceTally(event=event, choice=choice) for choice in choices]
+
+
+def record_vote(event: Event, ranking: list[int] | None):
+    """Add a submitted ranking to the running tally of ``event``.
+
+    Call this inside the transaction that submits the ballot. Events created
+    before running tallies existed have no rows and are left alone until the
+    ``rebuild_tallies`` command backfills them.
+    """
+    ChoiceTally.objects.filter(event=event, choice=first_choice(ranking)).update(
+        votes=F("votes") + 1
+    )
+
+
+async def tally_event(event: Event) -> TallyResult:
+    """Count every submitted ballot of ``event`` in one streaming pass.
+
+    Systems that can be served from the running tally skip the ballots
+    entirely when the event has one.
+    """
+    tally = get_tally(event.electoral_system, event.choices)
+    if tally.running:
+        counts = {
+            choice: votes
+            async for choice, votes in ChoiceTally.objects.filter(
+                event=event
+            ).values_list("choice", "votes")
+        }
+        if counts:
+            return tally.load_running_tally(counts).result()
+
+    rankings = (
+        Ballot.objects.filter(event=event, submitted__isnull=False)
+        .values_list("ranking", flat=True)
+        .aiterator(chunk_size=CHUNK_SIZE)
+    )
+    async for ranking in rankings:
+        tally.add_encoded(ranking)
+    return tally.result()
+
+
+try:
+    from . import tally_numpy  # noqa: F401
+except ImportError:
+    pass
@@ -0,0 +1,67 @@
+"""NumPy backend for instant-runoff counts with many distinct rankings.
+
+The grouped rankings are packed into a dense ``rankings x rank positions``
+matrix of choice indices, padded with ``len(choices)`` as an "exhausted"
+sentinel. Every row tracks its current preference; after an elimination only
+the rows pointing at an eliminated choice move on to their next continuing
+preference, and the counts are adjusted by the weight that moved instead of
+being recounted.
+"""
+
+from itertools import chain
+
+import numpy as np
+
+from .tally import InstantRunoffTally, register
+
+
+@register("RC", backend="numpy")
+class NumpyInstantRunoffTally(InstantRunoffTally):
+    def first_round_counts(self):
+        exhausted = len(self.choices)
+        rankings = len(self.rankings)
+        lengths = np.fromiter(map(len, self.rankings), np.intp, count=rankings)
+        flat = np.fromiter(
+            chain.from_iterable(self.rankings), np.int32, count=lengths.sum()
+        )
+        rows = np.repeat(np.arange(rankings), lengths)
+        columns = np.arange(flat.size) - np.repeat(lengths.cumsum() - lengths, lengths)
+
+        width = lengths.max(initial=0) + 1
+        self.matrix = np.full((rankings, width), exhausted, np.int32)
+        self.matrix[rows, columns] = flat
+        self.weights = np.fromiter(
+            self.rankings.values(), np.int64, count=len(self.rankings)
+        )
+
+        self.continuing = np.ones(exhausted + 1, bool)
+        self.continuing[exhausted] = False
+        self.current = self.matrix[:, 0].copy()
+        self.counts = self.bincount(self.current, self.weights)
+        return self.counts[:exhausted].tolist()
+
+    def bincount(self, indices, weights):
+        counts = np.bincount(indices, weights, minlength=len(self.choices) + 1)
+        return counts.round().astype(np.int64)
+
+    def redistribute(self, eliminated):
+        newly_eliminated = np.zeros_like(self.continuing)
+        newly_eliminated[eliminated] = True
+        self.continuing[eliminated] = False
+
+        rows = np.flatnonzero(newly_eliminated[self.current])
+        sub = self.matrix[rows]
+        # Preferences before the current position are already eliminated,
+        # so the first continuing column is the next preference. The
+        # sentinel column is never continuing: argmax() of an all-False row
+        # is 0, which those rows map to the sentinel below.
+        live = self.continuing[sub]
+        next_position = live.argmax(axis=1)
+        exhausted = ~live[np.arange(len(rows)), next_position]
+        next_position[exhausted] = sub.shape[1] - 1
+
+        moved = self.weights[rows]
+        self.counts -= self.bincount(self.current[rows], moved)
+        self.current[rows] = sub[np.arange(len(rows)), next_position]
+        self.counts += self.bincount(self.current[rows], moved)
+        return self.counts[: len(self.choices)].tolist()
@@ -1,12 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from io import StringIO
+import json
+import random
+import threading
+from unittest import mock, skipUnless
 import uuid
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from config import metrics
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from ninja.errors import Throttled
 from ninja.testing import TestClient, TestAsyncClient
-from .models import Event, Ballot
-from .api import router
+from config.api import api
+from config.renderers import dumps, loads
+from .models import ChoiceTally, Event, Ballot
+from . import live
+from .api import router, stream_event
+from .auth import events_for_token
+from .broker import OVERFLOW, QUEUE_SIZE, InMemoryBroker, PostgresBroker
+from .cache import (
+    abump_generation,
+    acached_results,
+    aget_generation,
+    aset_ballot_token_events,
+    generation_key,
+)
+from .checks import check_event_cache
+from .encoding import (
+    VALIDATORS,
+    ChoiceLookup,
+    InvalidVote,
+    decode_vote,
+    encode_vote,
+)
+from .pagination import BALLOT_ORDERING, ballots_after, encode_cursor
+from .queries import aget_event_and_role, asubmit_ballot, choice_lookup
+from .ratelimit import (
+    CacheRateLimiter,
+    InMemoryRateLimiter,
+    acheck_rate_limit,
+    get_rate_limiter,
+)
+from .roster import BATCH_SIZE
+from .schemas import BallotSchema
+from .streaming import NDJSON_CONTENT_TYPE
+from .ws import application as websocket_application
+from .tally import (
+    TALLIES,
+    PluralityTally,
+    UnknownElectoralSystem,
+    get_tally,
+    new_choice_tallies,
+)
 
 
-class EventTestCase(TestCase):
+class AsyncQueryCountMixin:
+    @asynccontextmanager
+    async def assertNumQueriesAsync(self, num):
+        # assertNumQueries() touches the connection directly, which Django
+        # refuses from async code; enter the context on the ORM's thread.
+        context = CaptureQueriesContext(connection)
+        await sync_to_async(context.__enter__)()
+        try:
+            yield context
+        finally:
+            await sync_to_async(context.__exit__)(None, None, None)
+        queries = await sync_to_async(lambda: context.captured_queries)()
+        self.assertEqual(
+            len(queries), num, "\n".join(query["sql"] for query in queries)
+        )
+
+
+class EventTestCase(AsyncQueryCountMixin, TestCase):
     def setUp(self):
         self.aclient = TestAsyncClient(router)
         self.event = Event.objects.create(
@@ -37,12 +117,100 @@ class EventTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    async def test_read_event_with_share_and_ballot_tokens(self):
+        ballot = await Ballot.objects.acreate(event=self.event, voter_name="Tina")
+
+        for token in (self.event.share_token, ballot.token):
+            response = await self.aclient.get(
+                f"/event/{self.event.id}", headers={"X-API-Key": token}
+            )
+            self.assertEqual(response.status_code, 200)
+
+    async def test_read_event_single_query(self):
+        await Ballot.objects.abulk_create(
+            Ballot(event=self.event, voter_name=f"Voter {i}") for i in range(50)
+        )
+        ballot = await Ballot.objects.acreate(event=self.event, voter_name="Last")
+
+        async with self.assertNumQueriesAsync(1):
+            response = await self.aclient.get(
+                f"/event/{self.event.id}", headers={"X-API-Key": ballot.token}
+            )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_read_event_with_other_events_ballot(self):
+        other = await Event.objects.acreate(
+            name="Other", choices=["A", "B"], electoral_system="PL"
+        )
+        ballot = await Ballot.objects.acreate(event=other, voter_name="Tina")
+
+        response = await self.aclient.get(
+            f"/event/{self.event.id}", headers={"X-API-Key": ballot.token}
+        )
+        self.assertEqual(response.status_code, 403)
+
     async def test_read_event_unauthorized(self):
         response = await self.aclient.get(
             f"/event/{self.event.id}", headers={"X-API-Key": uuid.uuid4()}
         )
         self.assertEqual(response.status_code, 403)
 
+    async def test_read_event_from_snapshot(self):
+        ballot = await Ballot.objects.acreate(event=self.event, voter_name="Tina")
+        url = f"/event/{self.event.id}"
+        host = {"X-API-Key": self.event.host_token}
+        await self.aclient.get(url, headers=host)
+
+        async with self.assertNumQueriesAsync(0):
+            response = await self.aclient.get(url, headers=host)
+        self.assertEqual(response.json()["name"], "Big Cookoff")
+
+        # A ballot token is looked up once, an unknown one every time.
+        for token, queries, status in [
+            (ballot.token, 1, 200),
+            (ballot.token, 0, 200),
+            (uuid.uuid4(), 1, 403),
+        ]:
+            async with self.assertNumQueriesAsync(queries):
+                response = await self.aclient.get(url, headers={"X-API-Key": token})
+            self.assertEqual(response.status_code, status)
+
+        await self.aclient.post(f"{url}/close", headers=host)
+        async with self.assertNumQueriesAsync(1):
+            response = await self.aclient.get(url, headers=host)
+        self.assertEqual(response.json()["status"], "CL")
+
+    async def test_ballot_tokens_of_a_large_event_stay_cached(self):
+        await Ballot.objects.abulk_create(
+            Ballot(event=self.event, voter_name=f"Voter {i}") for i in range(500)
+        )
+        url = f"/event/{self.event.id}"
+        tokens = [ballot.token async for ballot in self.event.ballot_set.all()]
+        for token in tokens:
+            await self.aclient.get(url, headers={"X-API-Key": token})
+
+        async with self.assertNumQueriesAsync(0):
+            for token in tokens:
+                response = await self.aclient.get(url, headers={"X-API-Key": token})
+                self.assertEqual(response.status_code, 200)
+
+    async def test_snapshot_read_during_change_is_not_served(self):
+        url = f"/event/{self.event.id}"
+        host = {"X-API-Key": self.event.host_token}
+
+        async def read_then_close(*args, **kwargs):
+            # The event is read, then closed before its snapshot is stored.
+            result = await aget_event_and_role(*args, **kwargs)
+            await self.aclient.post(f"{url}/close", headers=host)
+            return result
+
+        with mock.patch("vote.queries.aget_event_and_role", read_then_close):
+            response = await self.aclient.get(url, headers=host)
+        self.assertEqual(response.json()["status"], "RE")
+
+        response = await self.aclient.get(url, headers=host)
+        self.assertEqual(response.json()["status"], "CL")
+
     async def test_close_event(self):
         response = await self.aclient.post(
             f"/event/{self.event.id}/close",
@@ -70,6 +238,52 @@ class EventTestCase(TestCase):
         self.assertIsNone(event.closed)
         self.assertEqual(event.status, event.STATUS_CHOICES.VOTING)
 
+    async def test_status_transitions(self):
+        headers = {"X-API-Key": self.event.host_token}
+        url = f"/event/{self.event.id}/update-status"
+        for status, expected in [
+            ("VO", 200),
+            ("VO", 200),
+            ("RE", 200),
+            ("CL", 200),
+            ("RE", 409),
+            ("VO", 200),
+            ("CL", 200),
+        ]:
+            with self.subTest(status=status):
+                response = await self.aclient.patch(
+                    url, headers=headers, json={"status": status}
+                )
+                self.assertEqual(response.status_code, expected)
+        event = await Event.objects.aget(pk=self.event.id)
+        self.assertEqual(event.status, "CL")
+
+    async def test_status_change_errors(self):
+        response = await self.aclient.post(
+            f"/event/{self.event.id}/close",
+            headers={"X-API-Key": self.event.share_token},
+        )
+        self.assertEqual(response.status_code, 403)
+
+        response = await self.aclient.post(
+            f"/event/{self.event.id + 1}/close",
+            headers={"X-API-Key": self.event.host_token},
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_status_change_keeps_other_fields(self):
+        # A stale copy of the event must not be written back.
+        await Event.objects.filter(pk=self.event.id).aupdate(name="Renamed")
+        response = await self.aclient.post(
+            f"/event/{self.event.id}/show-results",
+            headers={"X-API-Key": self.event.host_token},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        event = await Event.objects.aget(pk=self.event.id)
+        self.assertEqual(event.name, "Renamed")
+        self.assertTrue(event.show_results)
+
 
 class BallotTestCase(TestCase):
     @classmethod
@@ -83,6 +297,10 @@ class BallotTestCase(TestCase):
         )
         self.ballot = Ballot.objects.create(event=self.event, voter_name="Becky")
 
+    def setUp(self):
+        # The tests share a ballot, and would share its rate limit.
+        get_rate_limiter.cache_clear()
+
     async def test_ballot_creation(self):
         response = await self.aclient.post(
             f"/event/{self.event.id}/create-ballot",
@@ -182,6 +400,90 @@ class BallotTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 403)
 
+    async def test_ballot_submission_by_index(self):
+        self.event.status = "VO"
+        await self.event.asave()
+
+        response = await self.aclient.post(
+            f"/ballot/{self.ballot.id}/submit",
+            headers={"X-API-Key": self.ballot.token},
+            json={"vote": 2},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["vote"], "Ed's Fusion Chili")
+
+        response = await self.aclient.get(
+            f"/ballot/{self.ballot.id}?vote_format=indices",
+            headers={"X-API-Key": self.ballot.token},
+        )
+        self.assertEqual(response.json()["vote"], [2])
+
+    async def test_invalid_ballot_submission(self):
+        self.event.status = "VO"
+        await self.event.asave()
+
+        for vote in (["Tom's Texas Chili", "Jim's Vegan Chili"], "Nope", 3, []):
+            with self.subTest(vote=vote):
+                response = await self.aclient.post(
+                    f"/ballot/{self.ballot.id}/submit",
+                    headers={"X-API-Key": self.ballot.token},
+                    json={"vote": vote},
+                )
+                self.assertEqual(response.status_code, 422)
+
+        ballot = await Ballot.objects.aget(pk=self.ballot.id)
+        self.assertIsNone(ballot.submitted)
+
+        for vote, status_code in (("Jim's Vegan Chili", 200), ("Nope", 409)):
+            response = await self.aclient.post(
+                f"/ballot/{self.ballot.id}/submit",
+                headers={"X-API-Key": self.ballot.token},
+                json={"vote": vote},
+            )
+            self.assertEqual(response.status_code, status_code)
+
+    async def test_vote_encoded_before_submission(self):
+        # With the token's event and its lookup cached, the vote is checked
+        # before the ballot is.
+        await aset_ballot_token_events([self.ballot.token], self.event.id)
+        choice_lookup(self.event.id, json.dumps(self.event.choices), "PL")
+
+        async def submit(vote):
+            response = await self.aclient.post(
+                f"/ballot/{self.ballot.id}/submit",
+                headers={"X-API-Key": self.ballot.token},
+                json={"vote": vote},
+            )
+            return response.status_code
+
+        self.assertEqual(await submit("Nope"), 409)
+        self.event.status = "VO"
+        await self.event.asave()
+        for vote, status_code in [
+            ("Nope", 422),
+            ("Jim's Vegan Chili", 200),
+            ("Nope", 409),
+        ]:
+            self.assertEqual(await submit(vote), status_code)
+
+        ballot = await Ballot.objects.aget(pk=self.ballot.id)
+        self.assertEqual(ballot.ranking, [1])
+
+    async def test_unknown_ballot_submission(self):
+        response = await self.aclient.post(
+            f"/ballot/{self.ballot.id + 1000}/submit",
+            headers={"X-API-Key": self.ballot.token},
+            json={"vote": "Ed's Fusion Chili"},
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_choice_lookup_is_cached(self):
+        # The choices as the UPDATE returns them, still encoded.
+        choices = json.dumps(self.event.choices)
+        lookup = choice_lookup(self.event.id, choices, self.event.electoral_system)
+        self.assertIs(choice_lookup(self.event.id, choices, "PL"), lookup)
+        self.assertEqual(lookup.encode("Jim's Vegan Chili"), [1])
+
     async def test_ballot_with_wrong_event_status(self):
         response = await self.aclient.post(
             f"/ballot/{self.ballot.id}/submit",
@@ -199,6 +501,14 @@ class BallotTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 409)
 
+        # The ballot can't be submitted, whatever the vote.
+        response = await self.aclient.post(
+            f"/ballot/{self.ballot.id}/submit",
+            headers={"X-API-Key": self.ballot.token},
+            json={"vote": "Nope"},
+        )
+        self.assertEqual(response.status_code, 409)
+
     async def test_ballot_list(self):
         event = Event(
             name="Small Cookoff",
@@ -320,3 +630,1400 @@ class BallotTestCase(TestCase):
             headers={"X-API-Key": uuid.uuid4()},
         )
         self.assertEqual(response.status_code, 403)
+
+
+class TallyTestCase(SimpleTestCase):
+    choices = ["Chilli 1", "Chilli 2", "Chilli 3", "Chilli 4"]
+
+    def count(self, electoral_system, rankings, choices=None, backend=None):
+        tally = get_tally(electoral_system, choices or self.choices, backend)
+        for ranking in rankings:
+            tally.add_encoded(ranking)
+        return tally
+
+    def test_plurality(self):
+        result = self.count("PL", [[1], [1], [0], [], None]).result()
+
+        self.assertEqual(result.ballots, 5)
+        self.assertEqual(len(result.rounds), 1)
+        self.assertEqual(
+            result.rounds[0].tallies,
+            {"Chilli 1": 1, "Chilli 2": 2, "Chilli 3": 0, "Chilli 4": 0},
+        )
+        self.assertEqual(result.rounds[0].exhausted, 2)
+        self.assertEqual(result.winners, ["Chilli 2"])
+
+    def test_plurality_tie_and_no_votes(self):
+        self.assertEqual(self.count("PL", []).result().winners, [])
+
+        tally = self.count("PL", [[0], [2]])
+        self.assertEqual(tally.result().winners, ["Chilli 1", "Chilli 3"])
+
+    def test_instant_runoff(self):
+        c1, c2, c3, c4 = self.choices
+        rankings = [[0, 1]] * 4 + [[1, 0]] * 3 + [[2, 1]] * 2 + [[3]] * 1
+        result = self.count("RC", rankings).result()
+
+        self.assertEqual(
+            [round_.eliminated for round_ in result.rounds], [[c4], [c3], []]
+        )
+        self.assertEqual(result.rounds[0].tallies, {c1: 4, c2: 3, c3: 2, c4: 1})
+        self.assertEqual(result.rounds[1].exhausted, 1)
+        self.assertEqual(result.rounds[2].tallies, {c1: 4, c2: 5})
+        self.assertEqual(result.winners, [c2])
+
+    def test_instant_runoff_full_tie(self):
+        c1, c2, _, _ = self.choices
+        result = self.count("RC", [[0], [1]], self.choices[:2]).result()
+        self.assertEqual(result.winners, [c1, c2])
+
+    def test_instant_runoff_backends_agree(self):
+        if "numpy" not in TALLIES["RC"]:
+            self.skipTest("numpy is not installed")
+
+        rng = random.Random(1234)
+        choices = range(len(self.choices))
+        rankings = []
+        for _ in range(2000):
+            rankings.append(rng.sample(choices, rng.randint(0, len(choices))))
+        # Near-ties exercise the batch elimination and shared wins.
+        rankings += [[0], [1]] * 3 + [None]
+
+        for size in (0, 1, 7, 50, len(rankings)):
+            python = self.count("RC", rankings[:size], backend="python")
+            numpy = self.count("RC", rankings[:size], backend="numpy")
+            self.assertEqual(python.result(), numpy.result())
+
+    def test_unknown_backend_falls_back_to_python(self):
+        self.assertIsInstance(
+            get_tally("PL", self.choices, "numpy"), PluralityTally
+        )
+
+    def test_unknown_electoral_system(self):
+        with self.assertRaises(UnknownElectoralSystem):
+            get_tally("XX", self.choices)
+
+
+class VoteEncodingTestCase(SimpleTestCase):
+    choices = ["A", "B", "C"]
+
+    def test_encode(self):
+        self.assertEqual(encode_vote("B", self.choices, "PL"), [1])
+        self.assertEqual(encode_vote([2], self.choices, "PL"), [2])
+        self.assertEqual(encode_vote(["C", 0, "B"], self.choices, "RC"), [2, 0, 1])
+
+    def test_invalid(self):
+        for vote, system in [
+            ("D", "PL"),
+            (3, "RC"),
+            (-1, "RC"),
+            (True, "RC"),
+            (None, "PL"),
+            ([], "RC"),
+            (["A", "B"], "PL"),
+            (["A", 0], "RC"),
+            ([["A"]], "RC"),
+        ]:
+            with self.subTest(vote=vote, system=system):
+                with self.assertRaises(InvalidVote):
+                    encode_vote(vote, self.choices, system)
+
+    def test_validators(self):
+        self.assertEqual(set(VALIDATORS), {"PL", "RC"})
+        lookup = ChoiceLookup(self.choices, "RC")
+        self.assertEqual(lookup.encode(["B"]), [1])
+        self.assertEqual(lookup.encode(["B", "C", "A"]), [1, 2, 0])
+        with self.assertRaisesMessage(InvalidVote, "'B' is chosen more than once"):
+            lookup.encode(["B", "A", 1])
+        # Other systems get the ranking checks.
+        with self.assertRaises(InvalidVote):
+            ChoiceLookup(self.choices, "XX").encode(["A", "A"])
+
+    def test_decode(self):
+        self.assertEqual(decode_vote([1], self.choices, "PL"), "B")
+        self.assertEqual(decode_vote([2, 0], self.choices, "RC"), ["C", "A"])
+        self.assertIsNone(decode_vote(None, self.choices, "RC"))
+
+
+class ResultsTestCase(TestCase):
+    def setUp(self):
+        self.aclient = TestAsyncClient(router)
+        self.event = Event.objects.create(
+            name="Small Cookoff",
+            choices=["Chilli 1", "Chilli 2", "Chilli 3"],
+            electoral_system="PL",
+            status="CL",
+        )
+        self.ballot = Ballot.objects.create(
+            event=self.event,
+            voter_name="Bob",
+            vote="Chilli 2",
+            submitted=datetime.now(timezone.utc),
+        )
+        Ballot.objects.create(event=self.event, voter_name="Jeff")
+
+    async def test_results_for_host(self):
+        response = await self.aclient.get(
+            f"/event/{self.event.id}/results",
+            headers={"X-API-Key": self.event.host_token},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "electoral_system": "PL",
+                "ballots": 1,
+                "rounds": [
+                    {
+                        "tallies": {"Chilli 1": 0, "Chilli 2": 1, "Chilli 3": 0},
+                        "exhausted": 0,
+                        "eliminated": [],
+                    }
+                ],
+                "winners": ["Chilli 2"],
+            },
+        )
+
+    async def test_results_for_voter_follow_show_results(self):
+        response = await self.aclient.get(
+            f"/event/{self.event.id}/results",
+            headers={"X-API-Key": self.ballot.token},
+        )
+        self.assertEqual(response.status_code, 403)
+
+        self.event.show_results = True
+        await self.event.asave()
+
+        response = await self.aclient.get(
+            f"/event/{self.event.id}/results",
+            headers={"X-API-Key": self.ballot.token},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = await self.aclient.get(
+            f"/event/{self.event.id}/results",
+            headers={"X-API-Key": self.event.share_token},
+        )
+        self.assertEqual(response.status_code, 403)
+
+    async def test_results_for_unknown_electoral_system(self):
+        self.event.electoral_system = "XX"
+        await self.event.asave()
+
+        response = await self.aclient.get(
+            f"/event/{self.event.id}/results",
+            headers={"X-API-Key": self.event.host_token},
+        )
+        self.assertEqual(response.status_code, 409)
+
+
+class RunningTallyTestCase(AsyncQueryCountMixin, TestCase):
+    def setUp(self):
+        self.aclient = TestAsyncClient(router)
+
+    async def create_event(self, electoral_system="PL"):
+        response = await self.aclient.post(
+            "/event/create",
+            json={
+                "name": "Small Cookoff",
+                "choices": ["Chilli 1", "Chilli 2", "Chilli 3"],
+                "electoral_system": electoral_system,
+            },
+        )
+        return await Event.objects.aget(pk=response.json()["id"])
+
+    async def submit(self, event, voter_name, vote, status_code=200):
+        ballot = await Ballot.objects.acreate(event=event, voter_name=voter_name)
+        response = await self.aclient.post(
+            f"/ballot/{ballot.id}/submit",
+            headers={"X-API-Key": ballot.token},
+            json={"vote": vote},
+        )
+        self.assertEqual(response.status_code, status_code)
+
+    async def counts(self, event):
+        return {
+            choice: votes
+            async for choice, votes in ChoiceTally.objects.filter(
+                event=event
+            ).values_list("choice", "votes")
+        }
+
+    async def test_submission_updates_running_tally(self):
+        event = await self.create_event()
+        self.assertEqual(await self.counts(event), {0: 0, 1: 0, 2: 0, -1: 0})
+
+        event.status = "VO"
+        await event.asave()
+        await self.submit(event, "Bob", "Chilli 2")
+        await self.submit(event, "Jeff", ["Chilli 2"])
+        await self.submit(event, "Billy", "Nope", status_code=422)
+
+        self.assertEqual(await self.counts(event), {0: 0, 1: 2, 2: 0, -1: 0})
+
+    async def test_plurality_results_read_running_tally(self):
+        event = await self.create_event()
+        event.status = "VO"
+        await event.asave()
+        await self.submit(event, "Bob", "Chilli 2")
+        await self.submit(event, "Jeff", "Chilli 3")
+        await self.submit(event, "Billy", "Chilli 3")
+
+        async with self.assertNumQueriesAsync(2):
+            response = await self.aclient.get(
+                f"/event/{event.id}/results",
+                headers={"X-API-Key": event.host_token},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["rounds"][0]["tallies"],
+            {"Chilli 1": 0, "Chilli 2": 1, "Chilli 3": 2},
+        )
+        self.assertEqual(response.json()["ballots"], 3)
+        self.assertEqual(response.json()["winners"], ["Chilli 3"])
+
+
+class RebuildTalliesCommandTestCase(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            name="Small Cookoff",
+            choices=["Chilli 1", "Chilli 2"],
+            electoral_system="PL",
+        )
+        for name, vote in (("Bob", "Chilli 2"), ("Jeff", "Chilli 2"), ("Al", None)):
+            Ballot.objects.create(
+                event=self.event,
+                voter_name=name,
+                vote=vote,
+                submitted=datetime.now(timezone.utc),
+            )
+        Ballot.objects.create(event=self.event, voter_name="Billy")
+
+    def counts(self):
+        return dict(
+            ChoiceTally.objects.filter(event=self.event).values_list(
+                "choice", "votes"
+            )
+        )
+
+    def test_rebuild(self):
+        call_command("rebuild_tallies", stdout=StringIO())
+        self.assertEqual(self.counts(), {0: 0, 1: 2, -1: 1})
+
+        ChoiceTally.objects.filter(event=self.event, choice=0).update(votes=5)
+        call_command("rebuild_tallies", self.event.id, stdout=StringIO())
+        self.assertEqual(self.counts(), {0: 0, 1: 2, -1: 1})
+
+    def test_rebuild_bumps_version(self):
+        version = Event.objects.get(pk=self.event.pk).version
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("rebuild_tallies", self.event.id, stdout=StringIO())
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, version + 1)
+
+    def test_verify(self):
+        with self.assertRaises(CommandError):
+            call_command("rebuild_tallies", "--verify", stdout=StringIO())
+
+        call_command("rebuild_tallies", stdout=StringIO())
+        call_command("rebuild_tallies", "--verify", stdout=StringIO())
+        self.assertEqual(self.counts(), {0: 0, 1: 2, -1: 1})
+
+
+class ResultsCacheTestCase(AsyncQueryCountMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.aclient = TestAsyncClient(router)
+        self.event = Event.objects.create(
+            name="Small Cookoff",
+            choices=["Chilli 1", "Chilli 2"],
+            electoral_system="RC",
+            status="VO",
+        )
+        self.ballot = Ballot.objects.create(event=self.event, voter_name="Bob")
+
+    async def get_results(self):
+        response = await self.aclient.get(
+            f"/event/{self.event.id}/results",
+            headers={"X-API-Key": self.event.host_token},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    async def test_results_are_cached(self):
+        await self.get_results()
+
+        # Only the event, for its version.
+        async with self.assertNumQueriesAsync(1):
+            results = await self.get_results()
+        self.assertEqual(results["ballots"], 0)
+
+    async def test_submission_invalidates_results(self):
+        await self.get_results()
+
+        response = await self.aclient.post(
+            f"/ballot/{self.ballot.id}/submit",
+            headers={"X-API-Key": self.ballot.token},
+            json={"vote": ["Chilli 2", "Chilli 1"]},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        results = await self.get_results()
+        self.assertEqual(results["ballots"], 1)
+        self.assertEqual(results["winners"], ["Chilli 2"])
+
+    async def get_version(self):
+        await self.event.arefresh_from_db(fields=["version"])
+        return self.event.version
+
+    async def test_host_actions_bump_version(self):
+        for action in ("close", "open", "show-results", "hide-results"):
+            version = await self.get_version()
+            response = await self.aclient.post(
+                f"/event/{self.event.id}/{action}",
+                headers={"X-API-Key": self.event.host_token},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(await self.get_version(), version)
+
+        version = await self.get_version()
+        response = await self.aclient.patch(
+            f"/event/{self.event.id}/update-status",
+            headers={"X-API-Key": self.event.host_token},
+            json={"status": "CL"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(await self.get_version(), version)
+
+    async def test_evicted_generation_restarts_higher(self):
+        await abump_generation(self.event.id)
+        generation = await aget_generation(self.event.id)
+
+        await cache.adelete(generation_key(self.event.id))
+        self.assertGreater(await aget_generation(self.event.id), generation)
+
+    async def test_concurrent_misses_share_one_computation(self):
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"winners": []}
+
+        results = await asyncio.gather(
+            *(acached_results(self.event, compute) for _ in range(10))
+        )
+
+        self.assertEqual(calls, 1)
+        self.assertEqual(results, [{"winners": []}] * 10)
+
+
+class ConditionalGetTestCase(AsyncQueryCountMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = Event.objects.create(
+            name="Big Cookoff",
+            choices=["Chilli 1", "Chilli 2"],
+            electoral_system="PL",
+        )
+        self.ballot = Ballot.objects.create(event=self.event, voter_name="Bob")
+        self.host = {"X-API-Key": str(self.event.host_token)}
+        self.url = f"/api/vote/event/{self.event.id}"
+
+    async def get(self, url, etag=None, **headers):
+        if etag:
+            headers["If-None-Match"] = etag
+        return await self.async_client.get(url, headers={**self.host, **headers})
+
+    async def test_read_event(self):
+        etag = (await self.get(self.url))["ETag"]
+
+        response = await self.get(self.url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        await self.async_client.post(f"{self.url}/show-results", headers=self.host)
+        response = await self.get(self.url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    async def test_list_ballots_not_read_when_not_modified(self):
+        url = f"{self.url}/ballots"
+        etag = (await self.get(url))["ETag"]
+
+        # Only the event, for its version.
+        async with self.assertNumQueriesAsync(1):
+            response = await self.get(url, etag)
+        self.assertEqual(response.status_code, 304)
+
+        ndjson = await self.get(url, etag, Accept=NDJSON_CONTENT_TYPE)
+        self.assertEqual(ndjson.status_code, 200)
+        self.assertNotEqual(ndjson["ETag"], etag)
+
+        await self.async_client.post(
+            f"{self.url}/create-ballot?voter_name=Tina",
+            headers={"X-API-Key": str(self.event.share_token)},
+        )
+        response = await self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    async def test_get_ballot(self):
+        url = f"/api/vote/ballot/{self.ballot.id}"
+        etag = (await self.get(url))["ETag"]
+        self.assertEqual((await self.get(url, etag)).status_code, 304)
+
+        await Event.objects.filter(pk=self.event.pk).aupdate(status="VO")
+        response = await self.async_client.post(
+            f"{url}/submit",
+            {"vote": "Chilli 2"},
+            content_type="application/json",
+            headers={"X-API-Key": str(self.ballot.token)},
+        )
+        self.assertEqual(response.status_code, 200)
+        response = await self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["vote"], "Chilli 2")
+
+    async def test_changes_outside_the_api(self):
+        ballots = f"{self.url}/ballots"
+        event_etag = (await self.get(self.url))["ETag"]
+        ballots_etag = (await self.get(ballots))["ETag"]
+
+        event = await Event.objects.aget(pk=self.event.pk)
+        event.status = "VO"
+        await event.asave()
+        response = await self.get(self.url, event_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "VO")
+
+        await Ballot.objects.acreate(event=self.event, voter_name="Tina")
+        self.assertEqual((await self.get(ballots, ballots_etag)).status_code, 200)
+
+    async def test_version_is_not_written_back(self):
+        # Loaded before a submission bumps the version, saved after it.
+        event = await Event.objects.aget(pk=self.event.pk)
+        await Event.objects.filter(pk=self.event.pk).aupdate(status="VO")
+        response = await self.async_client.post(
+            f"/api/vote/ballot/{self.ballot.id}/submit",
+            {"vote": "Chilli 2"},
+            content_type="application/json",
+            headers={"X-API-Key": str(self.ballot.token)},
+        )
+        self.assertEqual(response.status_code, 200)
+        submitted = await Event.objects.aget(pk=self.event.pk)
+
+        await event.asave()
+        await event.arefresh_from_db()
+        self.assertEqual(event.version, submitted.version + 1)
+
+
+@override_settings(VOTE_LIVE_POLL_INTERVAL=0.01)
+class LiveEventTestCase(TestCase):
+    def setUp(self):
+        self.aclient = TestAsyncClient(router)
+        self.event = Event.objects.create(
+            name="Small Cookoff",
+            choices=["Chilli 1", "Chilli 2"],
+            electoral_system="PL",
+        )
+
+    async def next_state(self, queue):
+        return await asyncio.wait_for(queue.get(), 1)
+
+    async def test_subscribers_share_one_watcher(self):
+        async with live.subscribe(self.event.id) as first:
+            async with live.subscribe(self.event.id) as second:
+                self.assertEqual(len(live._watchers), 1)
+                self.assertEqual((await self.next_state(first))["status"], "RE")
+                self.assertEqual((await self.next_state(second))["status"], "RE")
+
+                await Ballot.objects.acreate(
+                    event=self.event,
+                    voter_name="Bob",
+                    submitted=datetime.now(timezone.utc),
+                )
+                self.event.status = "VO"
+                await self.event.asave()
+
+                for queue in (first, second):
+                    state = await self.next_state(queue)
+                    self.assertEqual(state["status"], "VO")
+                    self.assertEqual(state["submitted_ballots"], 1)
+
+        self.assertEqual(live._watchers, {})
+
+    async def test_stream(self):
+        response = await stream_event(
+            None, self.event.id, token=None, query_token=self.event.share_token
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        stream = aiter(response.streaming_content)
+        self.assertIn(b'"status": "RE"', await anext(stream))
+
+        await self.event.adelete()
+        self.assertTrue((await anext(stream)).startswith(b"event: deleted"))
+        await stream.aclose()
+
+    async def test_stream_unauthorized(self):
+        response = await self.aclient.get(
+            f"/event/{self.event.id}/stream", headers={"X-API-Key": uuid.uuid4()}
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class BrokerTestCase(SimpleTestCase):
+    async def test_in_memory_broker(self):
+        broker = InMemoryBroker()
+
+        async with broker.subscribe(1) as first, broker.subscribe(1) as second:
+            async with broker.subscribe(2) as other:
+                await broker.publish(1, {"type": "ballot_created"})
+
+                self.assertEqual(first.get_nowait(), {"type": "ballot_created"})
+                self.assertEqual(second.get_nowait(), {"type": "ballot_created"})
+                self.assertTrue(other.empty())
+
+        self.assertEqual(broker.subscribers, {})
+
+    async def test_slow_subscriber_gets_overflow(self):
+        broker = InMemoryBroker()
+
+        async with broker.subscribe(1) as queue:
+            for i in range(QUEUE_SIZE + 1):
+                await broker.publish(1, {"i": i})
+
+            self.assertEqual(queue.get_nowait(), OVERFLOW)
+            self.assertTrue(queue.empty())
+
+
+@skipUnless(connection.vendor == "postgresql", "requires Postgres")
+class PostgresBrokerTestCase(TransactionTestCase):
+    async def test_publish_reaches_listener(self):
+        broker = PostgresBroker()
+
+        async with broker.subscribe(1) as queue:
+            # The listener connects in the background; retry until it's up.
+            for _ in range(50):
+                await broker.publish(1, {"type": "ballot_created"})
+                try:
+                    message = await asyncio.wait_for(queue.get(), 0.1)
+                    break
+                except TimeoutError:
+                    pass
+
+        broker.listener.cancel()
+        self.assertEqual(message, {"type": "ballot_created"})
+
+
+class WebSocketTestCase(TestCase):
+    def setUp(self):
+        self.aclient = TestAsyncClient(router)
+        self.event = Event.objects.create(
+            name="Small Cookoff",
+            choices=["Chilli 1", "Chilli 2"],
+            electoral_system="PL",
+            status="VO",
+        )
+        self.ballot = Ballot.objects.create(event=self.event, voter_name="Bob")
+
+    async def connect(self, path, query_string=b""):
+        received, sent = asyncio.Queue(), asyncio.Queue()
+        await received.put({"type": "websocket.connect"})
+        scope = {"type": "websocket", "path": path, "query_string": query_string}
+        task = asyncio.ensure_future(
+            websocket_application(scope, received.get, sent.put)
+        )
+        return task, received, sent
+
+    async def next_message(self, sent):
+        message = await asyncio.wait_for(sent.get(), 1)
+        if message["type"] == "websocket.send":
+            return json.loads(message["text"])
+        return message
+
+    async def test_receives_deltas(self):
+        task, received, sent = await self.connect(
+            f"/ws/vote/event/{self.event.id}/",
+            f"token={self.ballot.token}".encode(),
+        )
+
+        self.assertEqual(await self.next_message(sent), {"type": "websocket.accept"})
+        state = await self.next_message(sent)
+        self.assertEqual((state["type"], state["status"]), ("state", "VO"))
+
+        response = await self.aclient.post(
+            f"/ballot/{self.ballot.id}/submit",
+            headers={"X-API-Key": self.ballot.token},
+            json={"vote": "Chilli 1"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            await self.next_message(sent),
+            {"type": "ballot_submitted", "ballot_id": self.ballot.id},
+        )
+
+        response = await self.aclient.post(
+            f"/event/{self.event.id}/close",
+            headers={"X-API-Key": self.event.host_token},
+        )
+        message = await self.next_message(sent)
+        self.assertEqual((message["type"], message["status"]), ("event", "CL"))
+
+        await received.put({"type": "websocket.disconnect"})
+        await asyncio.wait_for(task, 1)
+
+    async def test_rejects_unauthorized(self):
+        for path, query_string, code in (
+            (f"/ws/vote/event/{self.event.id}/", f"token={uuid.uuid4()}", 4403),
+            (f"/ws/vote/event/{self.event.id}/", "token=nope", 4403),
+            ("/ws/vote/event/0/", f"token={self.ballot.token}", 4404),
+            ("/ws/nope/", "", 4404),
+        ):
+            task, _, sent = await self.connect(path, query_string.encode())
+            self.assertEqual(
+                await self.next_message(sent), {"type": "websocket.accept"}
+            )
+            self.assertEqual(
+                await self.next_message(sent),
+                {"type": "websocket.close", "code": code},
+            )
+            await asyncio.wait_for(task, 1)
+
+
+@skipUnless(connection.vendor == "postgresql", "requires Postgres")
+class QueryPlanTestCase(TestCase):
+    """The vote app's hot lookups can be answered from an index.
+
+    The test tables are tiny, so sequential scans, bitmap scans and sorts
+    are disabled for the transaction to make Postgres show the index it
+    would use at scale. The tables are analyzed with enough ballots in the
+    event that a ballot's token is the more selective of its indexed
+    columns, so plans don't depend on whatever statistics are left over.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            name="Small Cookoff", choices=["Chilli 1"], electoral_system="PL"
+        )
+        cls.ballot = Ballot.objects.create(event=cls.event, voter_name="Bob")
+        Ballot.objects.bulk_create(
+            Ballot(event=cls.event, voter_name=f"Voter {i}") for i in range(200)
+        )
+        with connection.cursor() as cursor:
+            for model in (Event, Ballot):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            for setting in ("enable_seqscan", "enable_bitmapscan", "enable_sort"):
+                cursor.execute(f"SET LOCAL {setting} = off")
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+
+    def test_event_token_lookups(self):
+        self.assertUsesIndex(
+            Event.objects.filter(share_token=self.event.share_token),
+            "event_share_token_idx",
+        )
+        self.assertUsesIndex(
+            Event.objects.filter(host_token=self.event.host_token),
+            "event_host_token_idx",
+        )
+
+    def test_role_lookup(self):
+        queryset = events_for_token(self.ballot.token).filter(pk=self.event.pk)
+        self.assertUsesIndex(queryset, "vote_event_pkey")
+        # The unique index on Ballot.token, whose name Django generates.
+        self.assertRegex(
+            queryset.explain(),
+            r"Index Scan using vote_ballot_token_\w+ on vote_ballot.*\n"
+            r".*Index Cond: \(token = ",
+        )
+
+    def test_ballot_list_ordering(self):
+        ballots = self.event.ballot_set.all().order_by(*BALLOT_ORDERING)
+        cursor = encode_cursor(ballots.values(*BALLOT_ORDERING).get(pk=self.ballot.pk))
+        self.assertUsesIndex(ballots, "ballot_event_order_idx")
+        self.assertUsesIndex(ballots_after(ballots, cursor), "ballot_event_order_idx")
+
+    def test_submitted_ballots(self):
+        self.assertUsesIndex(
+            Ballot.objects.filter(
+                event=self.event, submitted__isnull=False
+            ).values_list("ranking", flat=True),
+            "ballot_event_submitted_idx",
+        )
+
+
+class BallotRosterTestCase(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            name="Big Cookoff",
+            choices=["Chilli 1", "Chilli 2"],
+            electoral_system="PL",
+        )
+        Ballot.objects.create(event=self.event, voter_name="Becky")
+        self.url = f"/api/vote/event/{self.event.id}/create-ballots"
+
+    async def post_roster(self, token=None, **kwargs):
+        headers = {"X-API-Key": str(token or self.event.host_token)}
+        response = await self.async_client.post(self.url, headers=headers, **kwargs)
+        if response.streaming:
+            body = b"".join([chunk async for chunk in response.streaming_content])
+            response.rows = [json.loads(line) for line in body.splitlines()]
+        return response
+
+    async def test_create_ballots_from_json(self):
+        response = await self.post_roster(
+            data={"voter_names": ["Don", "Becky", "Ann", "Don"]},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(
+            [(row["voter_name"], row.get("error")) for row in response.rows],
+            [
+                ("Don", None),
+                ("Becky", "Duplicate voter name"),
+                ("Ann", None),
+                ("Don", "Duplicate voter name"),
+            ],
+        )
+
+        ballot = await Ballot.objects.aget(event=self.event, voter_name="Ann")
+        self.assertEqual(response.rows[2]["ballot_id"], ballot.id)
+        self.assertEqual(response.rows[2]["ballot_token"], str(ballot.token))
+        self.assertEqual(await Ballot.objects.filter(event=self.event).acount(), 3)
+
+    async def test_create_ballots_from_csv(self):
+        response = await self.post_roster(
+            data="voter_name\nDon\n\n Ann ,extra\n",
+            content_type="text/csv",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["voter_name"] for row in response.rows], ["Don", "Ann"])
+
+    async def test_create_ballots_in_batches(self):
+        names = [f"Voter {i}" for i in range(BATCH_SIZE + 10)]
+
+        response = await self.post_roster(
+            data={"voter_names": names}, content_type="application/json"
+        )
+
+        self.assertEqual([row["voter_name"] for row in response.rows], names)
+        self.assertEqual(
+            await Ballot.objects.filter(event=self.event).acount(), len(names) + 1
+        )
+
+    async def test_create_ballots_before_streaming(self):
+        names = [f"Voter {i}" for i in range(BATCH_SIZE + 10)]
+        response = await self.async_client.post(
+            self.url,
+            {"voter_names": names},
+            content_type="application/json",
+            headers={"X-API-Key": str(self.event.host_token)},
+        )
+
+        # Nothing has been read, as when the client disconnects.
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            await Ballot.objects.filter(event=self.event).acount(), len(names) + 1
+        )
+
+    async def test_create_ballots_rejections(self):
+        response = await self.post_roster(
+            token=self.event.share_token,
+            data={"voter_names": ["Don"]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 403)
+
+        response = await self.post_roster(
+            data={"voter_names": "Don"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 422)
+
+        self.event.status = "VO"
+        await self.event.asave()
+        response = await self.post_roster(
+            data={"voter_names": ["Don"]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 409)
+
+
+class BallotPaginationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            name="Small Cookoff",
+            choices=["Chilli 1", "Chilli 2"],
+            electoral_system="PL",
+        )
+        tie = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        for i in range(7):
+            ballot = Ballot.objects.create(event=cls.event, voter_name=f"Voter {i}")
+            # Shared created timestamps, with and without submissions, so
+            # the cursor has to break ties on submitted and id.
+            Ballot.objects.filter(pk=ballot.pk).update(
+                created=tie if i % 2 else datetime.now(timezone.utc),
+                submitted=tie if i % 3 == 0 else None,
+            )
+        cls.expected = list(
+            Ballot.objects.filter(event=cls.event)
+            .order_by(*BALLOT_ORDERING)
+            .values_list("id", flat=True)
+        )
+
+    def setUp(self):
+        self.aclient = TestAsyncClient(router)
+        self.headers = {"X-API-Key": self.event.host_token}
+
+    async def test_pages_follow_cursor(self):
+        ids, cursor = [], None
+        for _ in range(len(self.expected)):
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            response = await self.aclient.get(
+                f"/event/{self.event.id}/ballots",
+                headers=self.headers,
+                query_params=params,
+            )
+            self.assertEqual(response.status_code, 200)
+            ids += [ballot["id"] for ballot in response.json()]
+
+            cursor = response._response.get("X-Next-Cursor")
+            if cursor is None:
+                break
+
+        self.assertEqual(ids, self.expected)
+
+    async def test_invalid_cursor(self):
+        response = await self.aclient.get(
+            f"/event/{self.event.id}/ballots",
+            headers=self.headers,
+            query_params={"cursor": "nope"},
+        )
+        self.assertEqual(response.status_code, 422)
+
+    async def test_ndjson_stream(self):
+        url = f"/api/vote/event/{self.event.id}/ballots"
+        headers = {
+            "X-API-Key": str(self.event.host_token),
+            "Accept": "application/x-ndjson",
+        }
+
+        response = await self.async_client.get(url, headers=headers)
+        self.assertTrue(response.streaming)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in body.splitlines()]
+
+        # The router's test clients bind it to a bare NinjaAPI; compare with
+        # what the project's API renders.
+        router.set_api_instance(api)
+        host = {"X-API-Key": headers["X-API-Key"]}
+        plain = await self.async_client.get(url, headers=host)
+        self.assertEqual(rows, plain.json())
+
+        response = await self.async_client.get(url, {"limit": 2}, headers=headers)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), 2)
+        self.assertIn("X-Next-Cursor", response)
+
+
+class BallotListOutputTestCase(TestCase):
+    """list_ballots renders rows directly; the bytes must not change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            name="Big Cookoff",
+            choices=["Chilli 1", "Chilli 2", "Chilli 3"],
+            electoral_system="RC",
+            status="VO",
+        )
+        for i, vote in enumerate([["Chilli 3", "Chilli 1"], None, ["Chilli 2"]]):
+            Ballot.objects.create(
+                event=cls.event,
+                voter_name=f"Votér {i}",
+                vote=vote,
+                submitted=datetime.now(timezone.utc) if vote else None,
+            )
+
+    def setUp(self):
+        router.set_api_instance(api)
+        self.url = f"/api/vote/event/{self.event.id}/ballots"
+        self.host = {"X-API-Key": str(self.event.host_token)}
+
+    def schema_output(self, **params):
+        request = RequestFactory().get(self.url, params)
+        ballots = Ballot.objects.filter(event=self.event).order_by(*BALLOT_ORDERING)
+        return [
+            BallotSchema.from_orm(x, context={"request": request}).model_dump()
+            for x in ballots.select_related("event")
+        ]
+
+    async def test_same_bytes_as_schema(self):
+        for params in [{}, {"vote_format": "indices"}, {"limit": 2}]:
+            with self.subTest(params=params):
+                response = await self.async_client.get(
+                    self.url, params, headers=self.host
+                )
+                self.assertEqual(
+                    response["Content-Type"], "application/json; charset=utf-8"
+                )
+                expected = await sync_to_async(self.schema_output)(**params)
+                self.assertEqual(
+                    response.content, dumps(expected[: params.get("limit")])
+                )
+
+    def test_openapi_schema(self):
+        operation = api.get_openapi_schema()["paths"][
+            "/api/vote/event/{event_id}/ballots"
+        ]["get"]
+        self.assertEqual(
+            operation["responses"][200]["content"]["application/json"]["schema"],
+            {
+                "items": {"$ref": "#/components/schemas/BallotSchema"},
+                "title": "Response",
+                "type": "array",
+            },
+        )
+
+
+class JSONRenderingTestCase(SimpleTestCase):
+    data = {
+        "id": 1,
+        "token": uuid.UUID(int=1),
+        "created": datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+        "submitted": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        "vote": ["Chilli 1", "Chilli ½"],
+    }
+
+    def test_backends_write_the_same_values(self):
+        values = []
+        for backend in ["json", "orjson"]:
+            with self.settings(API_JSON_BACKEND=backend):
+                values.append(loads(dumps(self.data)))
+        self.assertEqual(values[0], values[1])
+        # Datetimes keep Django's millisecond precision.
+        self.assertEqual(
+            values[0],
+            {
+                "id": 1,
+                "token": "00000000-0000-0000-0000-000000000001",
+                "created": "2026-01-02T03:04:05.678Z",
+                "submitted": "2026-01-02T03:04:05Z",
+                "vote": ["Chilli 1", "Chilli ½"],
+            },
+        )
+        django = json.dumps(self.data, cls=DjangoJSONEncoder)
+        self.assertEqual(values[0], json.loads(django))
+
+
+@override_settings(
+    METRICS_ENABLED=True,
+    MIDDLEWARE=[
+        "config.metrics.MetricsMiddleware",
+        # Already there with DJANGO_METRICS=true.
+        *(m for m in settings.MIDDLEWARE if m != "config.metrics.MetricsMiddleware"),
+    ],
+)
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        # The test connection predates the middleware, which only hooks
+        # connections opened after it loads.
+        metrics.install_query_counter(connection)
+        self.addCleanup(connection.execute_wrappers.remove, metrics.count_query)
+        metrics.registry.reset()
+        self.event = Event.objects.create(
+            name="Big Cookoff", choices=["A", "B"], electoral_system="PL"
+        )
+        self.url = f"/api/vote/event/{self.event.id}"
+
+    def labels(self, status="200"):
+        return f'method="GET",route="api/vote/event/<event_id>",status="{status}"'
+
+    async def test_records_route_queries_and_size(self):
+        headers = {"X-API-Key": str(self.event.host_token)}
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        forbidden = {"X-API-Key": str(uuid.uuid4())}
+        await self.async_client.get(self.url, headers=forbidden)
+
+        scrape = await self.async_client.get(f"/{settings.METRICS_PATH}")
+        self.assertEqual(scrape.status_code, 200)
+        text = scrape.content.decode()
+        self.assertIn(f"http_requests_total{{{self.labels()}}} 1\n", text)
+        self.assertIn(f"http_requests_total{{{self.labels('403')}}} 1\n", text)
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{self.labels()},le="+Inf"}} 1\n',
+            text,
+        )
+        self.assertIn(f"http_request_db_queries_total{{{self.labels()}}} 1\n", text)
+        self.assertIn(
+            f"http_response_size_bytes_total{{{self.labels()}}}"
+            f" {len(response.content)}\n",
+            text,
+        )
+
+    @override_settings(DEBUG=True)
+    async def test_server_timing_in_debug(self):
+        headers = {"X-API-Key": str(self.event.host_token)}
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="1 queries"$',
+        )
+
+    async def test_no_server_timing_without_debug(self):
+        headers = {"X-API-Key": str(self.event.host_token)}
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(METRICS_ENABLED=False)
+    async def test_endpoint_disabled(self):
+        response = await self.async_client.get(f"/{settings.METRICS_PATH}")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MIDDLEWARE=["config.middleware.PathScopedMiddleware"])
+class ApiProfileTestCase(TestCase):
+    async def test_vote_api_skips_middleware(self):
+        event = await Event.objects.acreate(
+            name="Big Cookoff", choices=["A", "B"], electoral_system="PL"
+        )
+        response = await self.async_client.get(
+            f"/api/vote/event/{event.id}",
+            headers={"X-API-Key": str(event.host_token)},
+        )
+        self.assertEqual(response.status_code, 200)
+        # Sessions are left out.
+        self.assertNotIn("Vary", response)
+
+        response = await self.async_client.get("/api/user/current-user")
+        self.assertEqual(response["Vary"], "Cookie")
+
+    async def test_vote_api_keeps_host_and_security_checks(self):
+        url = "/api/vote/event/1"
+        response = await self.async_client.get(url, headers={"Host": "evil.example"})
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.get(url)
+        self.assertEqual(response["X-Content-Type-Options"], "nosniff")
+
+    @override_settings(SECURE_SSL_REDIRECT=True)
+    async def test_vote_api_redirects_to_https(self):
+        url = "/api/vote/event/1"
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response["Location"], f"https://testserver{url}")
+
+    async def test_user_api_keeps_session_auth(self):
+        user = await get_user_model().objects.acreate(username="becky")
+        url = "/api/user/current-user"
+        self.assertEqual((await self.async_client.get(url)).status_code, 401)
+
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"id": user.id})
+
+
+class EndpointQueryCountTestCase(AsyncQueryCountMixin, TestCase):
+    """Pins the number of queries of every endpoint in vote/api.py.
+
+    Writes made in a transaction add a SAVEPOINT and a RELEASE here, since
+    each test already runs inside one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            name="Big Cookoff", choices=["A", "B"], electoral_system="PL"
+        )
+        ChoiceTally.objects.bulk_create(new_choice_tallies(cls.event))
+        cls.ballot = Ballot.objects.create(event=cls.event, voter_name="Becky")
+
+    def setUp(self):
+        cache.clear()
+        self.host = {"X-API-Key": str(self.event.host_token)}
+        self.url = f"/api/vote/event/{self.event.id}"
+
+    async def set_status(self, status):
+        await Event.objects.filter(pk=self.event.pk).aupdate(
+            status=status, show_results=True
+        )
+
+    async def test_create_event(self):
+        payload = {"name": "Chili", "choices": ["A"], "electoral_system": "PL"}
+        async with self.assertNumQueriesAsync(2):
+            response = await self.async_client.post(
+                "/api/vote/event/create", payload, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 201)
+
+    async def test_read_event(self):
+        async with self.assertNumQueriesAsync(1):
+            response = await self.async_client.get(self.url, headers=self.host)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_stream_event(self):
+        async with self.assertNumQueriesAsync(1):
+            response = await self.async_client.get(
+                f"{self.url}/stream", headers=self.host
+            )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_status_transitions(self):
+        for method, path, body in [
+            ("patch", "update-status", {"status": "VO"}),
+            ("post", "close", None),
+            ("post", "open", None),
+            ("post", "show-results", None),
+            ("post", "hide-results", None),
+        ]:
+            with self.subTest(path):
+                async with self.assertNumQueriesAsync(1):
+                    response = await getattr(self.async_client, method)(
+                        f"{self.url}/{path}",
+                        body,
+                        content_type="application/json",
+                        headers=self.host,
+                    )
+                self.assertEqual(response.status_code, 200)
+
+    async def test_read_results(self):
+        async with self.assertNumQueriesAsync(2):
+            response = await self.async_client.get(
+                f"{self.url}/results", headers=self.host
+            )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_list_ballots(self):
+        async with self.assertNumQueriesAsync(2):
+            response = await self.async_client.get(
+                f"{self.url}/ballots", headers=self.host
+            )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_create_ballot(self):
+        # The event, the INSERT and the bump of the event's version.
+        async with self.assertNumQueriesAsync(3):
+            response = await self.async_client.post(
+                f"{self.url}/create-ballot?voter_name=Don",
+                headers={"X-API-Key": str(self.event.share_token)},
+            )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_create_ballots(self):
+        # The event, then per batch the existing names, one INSERT and the
+        # bump of the event's version.
+        async with self.assertNumQueriesAsync(4):
+            response = await self.async_client.post(
+                f"{self.url}/create-ballots",
+                {"voter_names": ["Don", "Eve"]},
+                content_type="application/json",
+                headers=self.host,
+            )
+            b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(response.status_code, 200)
+
+    async def test_submit_ballot(self):
+        await self.set_status("VO")
+        # The conditional UPDATE, then the ballot's ranking and the running
+        # tally's, in a savepoint.
+        async with self.assertNumQueriesAsync(5):
+            response = await self.async_client.post(
+                f"/api/vote/ballot/{self.ballot.id}/submit",
+                {"vote": "A"},
+                content_type="application/json",
+                headers={"X-API-Key": str(self.ballot.token)},
+            )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_submit_created_ballot(self):
+        response = await self.async_client.post(
+            f"{self.url}/create-ballot?voter_name=Don",
+            headers={"X-API-Key": str(self.event.share_token)},
+        )
+        ballot = response.json()
+        await self.set_status("VO")
+        response = await self.async_client.post(
+            f"/api/vote/ballot/{self.ballot.id}/submit",
+            {"vote": "A"},
+            content_type="application/json",
+            headers={"X-API-Key": str(self.ballot.token)},
+        )
+        self.assertEqual(response.status_code, 200)
+        # The event's lookup is cached by the first submission, and the
+        # token's event by create_ballot: the conditional UPDATE writes the
+        # ranking too, then the running tally, in a savepoint.
+        async with self.assertNumQueriesAsync(4):
+            response = await self.async_client.post(
+                f"/api/vote/ballot/{ballot['ballot_id']}/submit",
+                {"vote": "B"},
+                content_type="application/json",
+                headers={"X-API-Key": ballot["ballot_token"]},
+            )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_get_ballot(self):
+        async with self.assertNumQueriesAsync(1):
+            response = await self.async_client.get(
+                f"/api/vote/ballot/{self.ballot.id}", headers=self.host
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(VOTE_RATE_LIMIT_BURST=2, VOTE_RATE_LIMIT_RATE=0.5)
+class RateLimitTestCase(AsyncQueryCountMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        get_rate_limiter.cache_clear()
+        self.addCleanup(get_rate_limiter.cache_clear)
+        router.set_api_instance(api)
+        self.event = Event.objects.create(
+            name="Big Cookoff", choices=["A", "B"], electoral_system="PL"
+        )
+        self.url = f"/api/vote/event/{self.event.id}/create-ballot"
+        self.share = {"X-API-Key": str(self.event.share_token)}
+
+    async def test_token_bucket(self):
+        limiter = InMemoryRateLimiter()
+        now = 1000.0
+        limiter.clock = lambda: now
+        self.assertEqual([await limiter.atake("a") for _ in range(3)], [0, 0, 2])
+        self.assertEqual(await limiter.atake("b"), 0)
+        now += 1
+        self.assertEqual(await limiter.atake("a"), 1)
+        now += 2
+        self.assertEqual(await limiter.atake("a"), 0)
+
+    async def test_cache_windows(self):
+        limiter = CacheRateLimiter()
+        # Windows of 4 seconds, the first from 1000 to 1004.
+        now = 1001.0
+        limiter.clock = lambda: now
+        self.assertEqual([await limiter.atake("a") for _ in range(3)], [0, 0, 3])
+        self.assertEqual(await limiter.atake("b"), 0)
+        now += 3
+        self.assertEqual(await limiter.atake("a"), 0)
+
+    async def test_cache_counts_concurrent_requests(self):
+        limiter = CacheRateLimiter()
+        waits = await asyncio.gather(*(limiter.atake("a") for _ in range(10)))
+        self.assertEqual(waits.count(0), 2)
+
+    async def test_rejected_without_queries(self):
+        for i in range(2):
+            response = await self.async_client.post(
+                f"{self.url}?voter_name=Voter {i}", headers=self.share
+            )
+            self.assertEqual(response.status_code, 200)
+
+        async with self.assertNumQueriesAsync(0):
+            response = await self.async_client.post(
+                f"{self.url}?voter_name=Voter 2", headers=self.share
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "2")
+
+    async def test_bucket_per_event_id(self):
+        urls = [
+            f"/api/vote/event/{event_id}/create-ballot"
+            for event_id in (self.event.id, f"0{self.event.id}", f"00{self.event.id}")
+        ]
+        statuses = []
+        for i, url in enumerate(urls):
+            response = await self.async_client.post(
+                f"{url}?voter_name=Voter {i}", headers=self.share
+            )
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [200, 200, 429])
+
+    async def test_one_bucket_for_all_ballots(self):
+        statuses = []
+        for ballot_id in range(1000, 1003):
+            response = await self.async_client.post(
+                f"/api/vote/ballot/{ballot_id}/submit",
+                {"vote": "A"},
+                content_type="application/json",
+                headers={"X-API-Key": str(uuid.uuid4())},
+            )
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [404, 404, 429])
+
+    async def test_bucket_per_client(self):
+        factory = RequestFactory()
+
+        async def allowed(address, forwarded="10.0.0.9"):
+            request = factory.post(
+                self.url, REMOTE_ADDR=address, HTTP_X_FORWARDED_FOR=forwarded
+            )
+            try:
+                await acheck_rate_limit(request, "create_ballot", self.event.id)
+            except Throttled as err:
+                self.assertAlmostEqual(err.wait, 2, places=1)
+                return False
+            return True
+
+        self.assertEqual(
+            [await allowed("10.0.0.1") for _ in range(3)], [True, True, False]
+        )
+        # X-Forwarded-For is not trusted without proxies.
+        self.assertFalse(await allowed("10.0.0.1", forwarded="10.0.0.3"))
+        self.assertTrue(await allowed("10.0.0.2"))
+
+
+class EventCacheCheckTestCase(SimpleTestCase):
+    def test_per_process_event_cache(self):
+        self.assertEqual([w.id for w in check_event_cache(None)], ["vote.W001"])
+        shared = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://localhost:6379",
+            }
+        }
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_event_cache(None), [])
+
+
+class ConcurrentSubmissionTestCase(TransactionTestCase):
+    def test_one_of_concurrent_submissions_wins(self):
+        event = Event.objects.create(
+            name="Big Cookoff", choices=["A", "B"], electoral_system="PL", status="VO"
+        )
+        ChoiceTally.objects.bulk_create(new_choice_tallies(event))
+        ballot = Ballot.objects.create(event=event, voter_name="Becky")
+        barrier = threading.Barrier(2)
+
+        def submit(vote):
+            # Each thread has its own connection, so the UPDATEs race.
+            try:
+                barrier.wait()
+                return async_to_sync(asubmit_ballot)(
+                    ballot.id, ballot.token, vote, datetime.now(timezone.utc)
+                )
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(2) as executor:
+            results = list(executor.map(submit, ["A", "B"]))
+
+        self.assertEqual(sum(result is not None for result in results), 1)
+        winner = next(result for result in results if result is not None)
+        ballot.refresh_from_db()
+        self.assertEqual(ballot.vote, winner.vote)
+        self.assertEqual(
+            sum(ChoiceTally.objects.filter(event=event).values_list("votes", flat=True)),
+            1,
+        )
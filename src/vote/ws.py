@@ -0,0 +1,97 @@
+"""WebSocket endpoint streaming live deltas of one event.
+
+Clients connect to ``/ws/vote/event/<event_id>/`` with their X-API-Key either
+in the ``token`` query parameter (browsers cannot set WebSocket headers) or
+in an ``X-API-Key`` header. Hosts, share-link holders and voters receive the
+event's current state once, then every message published for the event on
+the configured broker. Rejected connections are accepted and then closed,
+since a close before the handshake reaches clients as an HTTP 403 without
+its code: 4404 for an unknown event, 4403 for a key without access.
+"""
+
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404
+
+from . import live
+from .auth import Role
+from .broker import get_broker
+from .queries import EVENT_ROLE, aget_event_and_role
+
+PATH = re.compile(r"^/ws/vote/event/(?P<event_id>\d+)/?$")
+
+
+def get_token(scope) -> uuid.UUID | None:
+    query = parse_qs(scope.get("query_string", b"").decode())
+    tokens = query.get("token", [])
+    for name, value in scope.get("headers", ()):
+        if name == b"x-api-key":
+            tokens.append(value.decode())
+    try:
+        return uuid.UUID(tokens[0])
+    except (IndexError, ValueError):
+        return None
+
+
+async def send_json(send, message: dict):
+    text = json.dumps(message, cls=DjangoJSONEncoder)
+    await send({"type": "websocket.send", "text": text})
+
+
+async def reject(send, code: int):
+    await send({"type": "websocket.accept"})
+    await send({"type": "websocket.close", "code": code})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def application(scope, receive, send):
+    if (await receive())["type"] != "websocket.connect":
+        return
+
+    match = PATH.match(scope["path"])
+    if match is None:
+        await reject(send, 4404)
+        return
+
+    try:
+        event, role = await aget_event_and_role(
+            int(match["event_id"]), get_token(scope), EVENT_ROLE
+        )
+    except Http404:
+        await reject(send, 4404)
+        return
+    if role == Role.NONE:
+        await reject(send, 4403)
+        return
+
+    # Subscribe before reading the state so no change falls in between.
+    async with get_broker().subscribe(event.id) as messages:
+        state = await live.aget_state(event.id)
+        if state is None:
+            await reject(send, 4404)
+            return
+        await send({"type": "websocket.accept"})
+        await send_json(send, {"type": "state", **state})
+
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            while True:
+                message = asyncio.ensure_future(messages.get())
+                await asyncio.wait(
+                    {message, disconnect}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnect.done():
+                    message.cancel()
+                    return
+                await send_json(send, message.result())
+        finally:
+            disconnect.cancel()